@@ -5,14 +5,18 @@ __email__ = "shushanth@gmail.com"
 __version__ = "1.0"
 
 from tkinter import Frame, messagebox, Label, Menu, SUNKEN
-from tkinter import E, W, X, Y, BOTH, LEFT, BOTTOM, TclError
+from tkinter import E, W, X, Y, BOTH, LEFT, TclError, DISABLED, NORMAL
 from tkinter import Toplevel, Entry, Button
+from threading import Thread, Event
+from queue import Queue, Empty
 
-from tkinter.filedialog import askopenfilename, asksaveasfile
+from tkinter.filedialog import askopenfilename, asksaveasfilename
 from PIL import ImageTk, Image
 
 from NetworkParser import foster_solver as fs
 from NetworkParser import cauer_solver as cs
+from NetworkParser import batch_solver as bs
+from NetworkParser import asc_writer as aw
 
 # TODO need to put OPTIONS window in a new Class
 # TODO Foster Options Window Esc closes the whole app instead of just the window
@@ -29,6 +33,10 @@ default_foster_xtol = 0.00000001
 # CREATE DIAGONOSTIC
 default_foster_diagnostic = False
 default_cauer_diagnostic = False
+# SOLVER MODE
+default_foster_solver = fs.joint_solver
+# PROGRESS POLLING INTERVAL IN ms
+solver_poll_interval = 100
 
 
 class MainWindow(Frame):
@@ -44,6 +52,7 @@ class MainWindow(Frame):
         self.foster_xtol = default_foster_xtol
         self.foster_diagnostic = default_foster_diagnostic
         self.cauer_diagnostic = default_cauer_diagnostic
+        self.foster_solver = default_foster_solver
 
         # INITIALIZE
         self.menu = None
@@ -55,6 +64,17 @@ class MainWindow(Frame):
 
         self.r_list = []
         self.c_list = []
+        self.rc_network = None
+        self.network_type = None
+
+        # BACKGROUND SOLVER
+        self.foster_button = None
+        self.cauer_button = None
+        self.cancel_button = None
+        self.solver_thread = None
+        self.solver_queue = None
+        self.solver_cancel = None
+        self.solver_progress = {}
         # ICON and TTTLE BAR
         self.master.title('RC 1D Network')
         self.master.iconbitmap('images//RC.ico')
@@ -76,7 +96,8 @@ class MainWindow(Frame):
         return (
             self.foster_lower_bound, self.foster_upper_bound, self.foster_ftol, self.foster_xtol,
             self.foster_diagnostic,
-            self.cauer_diagnostic)
+            self.cauer_diagnostic,
+            self.foster_solver) + fs.foster_default_value()[fs.foster_solver_index + 1:]
 
     def create_widgets(self):
         """
@@ -86,8 +107,7 @@ class MainWindow(Frame):
         self.create_menu_panels()
         self.create_buttons()
         # STATUS BAR
-        self.status_bar = Label(self, text='Tool to create 1D RC Network', borderwidth=1, font='Helv 10', anchor=W)
-        self.status_bar.pack(side="left", fill=X)
+        self.create_status_bar()
 
     def create_buttons(self):
         """
@@ -104,7 +124,11 @@ class MainWindow(Frame):
 
         foster_button = Button(buttons_frame, text='Create Foster Network', command=self.btn_foster)
         cauer_button = Button(buttons_frame, text='Create Cauer Network', command=self.btn_cauer)
+        cancel_button = Button(buttons_frame, text='Cancel', command=self.btn_cancel, state=DISABLED)
         foster_button.focus()
+        self.foster_button = foster_button
+        self.cauer_button = cauer_button
+        self.cancel_button = cancel_button
 
         cauer_button.bind("<Enter>",
                           lambda a: self.status_bar.configure(text="Import Zth curves to create a Cauer Network"))
@@ -116,43 +140,133 @@ class MainWindow(Frame):
 
         cauer_button.grid(in_=buttons_frame, row=2, column=1, sticky=E)
         foster_button.grid(in_=buttons_frame, row=1, column=1, sticky=E)
+        cancel_button.grid(in_=buttons_frame, row=3, column=1, sticky=E)
 
     def btn_foster(self):
-        try:
-            filepath = askopenfilename(filetypes=[("Text Files", "*.csv"), ("All Files", "*.*")])
-            rc_network = fs.get_foster_network(filepath, self.foster_default_value)
-
-            self.r_list, self.c_list = fs.sort_rc_list(rc_network)
-            print(self.r_list, "\n", self.c_list)
-            self.show_network(self.r_list, self.c_list)
-
-        except fs.FC_Error_list.FosterCauer_Error as error:
-            error = str(error)
-            messagebox.showerror(title="Error", message=error)
+        filepath = askopenfilename(filetypes=[("Text Files", "*.csv"), ("All Files", "*.*")])
+        if filepath:
+            self.start_solver(fs.get_foster_network, filepath, self.show_foster_network)
 
     def btn_cauer(self):
-        try:
-            file_path = askopenfilename(filetypes=[("Text Files", "*.csv"), ("All Files", "*.*")])
-            rc_network = cs.get_cauer_network(file_path)
+        file_path = askopenfilename(filetypes=[("Text Files", "*.csv"), ("All Files", "*.*")])
+        if file_path:
+            self.start_solver(cs.get_cauer_network, file_path, self.show_cauer_network)
 
-            self.c_list, self.r_list = cs.sort_rc_list(rc_network)
-            print(self.r_list, "\n", self.c_list)
-            self.show_network(self.r_list, self.c_list)
+    def btn_cancel(self):
+        """
+        Ask the running solve to stop at its next residual evaluation
+        :return: None
+        """
+        if self.solver_cancel is not None:
+            self.solver_cancel.set()
+            self.status_bar.configure(text="Cancelling...")
+
+    def show_foster_network(self, rc_network):
+        self.rc_network, self.network_type = rc_network, bs.foster_network
+        self.r_list, self.c_list = fs.sort_rc_list(rc_network)
+        print(self.r_list, "\n", self.c_list)
+        self.show_network(self.r_list, self.c_list)
+
+    def show_cauer_network(self, rc_network):
+        self.rc_network, self.network_type = rc_network, bs.cauer_network
+        self.c_list, self.r_list = cs.sort_rc_list(rc_network)
+        print(self.r_list, "\n", self.c_list)
+        self.show_network(self.r_list, self.c_list)
+
+    def start_solver(self, solver, file_path, on_result):
+        """
+        Run a solver on a worker thread, progress is polled from the Tk event loop
+        :param solver: get_foster_network or get_cauer_network
+        :param file_path: CSV File
+        :param on_result: Called with the network once the solve finished
+        :return: None
+        """
+        if self.solver_thread is not None and self.solver_thread.is_alive():
+            return
+        self.solver_queue = Queue()
+        self.solver_cancel = Event()
+        self.solver_progress = {}
+        cancel = self.solver_cancel
+        solver_queue = self.solver_queue
+        default_values = self.foster_default_value
+
+        def progress(event):
+            if cancel.is_set():
+                raise fs.FC_Error_list.FosterCauer_Cancelled("Solve cancelled")
+            solver_queue.put(('progress', event))
+
+        def run():
+            try:
+                solver_queue.put(('done', solver(file_path, default_values, progress)))
+            except fs.FC_Error_list.FosterCauer_Error as error:
+                solver_queue.put(('error', error))
+            except Exception as error:
+                solver_queue.put(('error', fs.FC_Error_list.FosterCauer_Error("Random Error \n " + str(error))))
+
+        self.foster_button.configure(state=DISABLED)
+        self.cauer_button.configure(state=DISABLED)
+        self.cancel_button.configure(state=NORMAL)
+        self.status_bar.configure(text="Solving...")
+        self.solver_thread = Thread(target=run, daemon=True)
+        self.solver_thread.start()
+        self.after(solver_poll_interval, self.poll_solver, on_result)
+
+    def poll_solver(self, on_result):
+        """
+        Show the progress of the worker thread and pick up its result
+        :param on_result: Called with the network once the solve finished
+        :return: None
+        """
+        while True:
+            try:
+                kind, value = self.solver_queue.get_nowait()
+            except Empty:
+                break
+            if kind == 'progress':
+                self.solver_progress.update(value)
+                continue
+
+            self.foster_button.configure(state=NORMAL)
+            self.cauer_button.configure(state=NORMAL)
+            self.cancel_button.configure(state=DISABLED)
+            self.solver_thread = None
+            if kind == 'done':
+                self.status_bar.configure(text="Done")
+                on_result(value)
+            elif isinstance(value, fs.FC_Error_list.FosterCauer_Cancelled):
+                self.status_bar.configure(text="Cancelled")
+            else:
+                self.status_bar.configure(text=" ")
+                messagebox.showerror(title="Error", message=str(value))
+            return
+
+        self.status_bar.configure(text=self.progress_text())
+        self.after(solver_poll_interval, self.poll_solver, on_result)
 
-        except cs.FC_Error_list.FosterCauer_Error as error:
-            error = str(error)
-            messagebox.showerror(title="Error", messagebox=error)
+    def progress_text(self):
+        """
+        Status bar text of the running solve
+        :return: Text
+        """
+        progress = self.solver_progress
+        if not progress:
+            return "Solving..."
+        if progress.get('stage') == 'cauer':
+            return "Converting " + str(progress['order']) + " RC pairs to Cauer..."
+        text = "Order " + str(progress.get('order')) + "  nfev " + str(progress.get('nfev', 0))
+        if 'best_error' in progress:
+            text += "  best error " + "%.4g" % progress['best_error']
+        return text
 
     def create_status_bar(self):
         """
         Create Status bar
         :return: None
         """
-        status_bar = Frame()
-        self.status = Label(self.master, text='Tool to create 1D RC Network', borderwidth=1,
-                            font='Helv 10', anchor=W, relief=SUNKEN, name='status')
-        self.status.pack(side=LEFT, padx=2, expand=Y, fill=BOTH)
-        status_bar.pack(side=BOTTOM, fill=X, pady=2)
+        self.status_bar = Label(self, text='Tool to create 1D RC Network', borderwidth=1,
+                                font='Helv 10', anchor=W, relief=SUNKEN, name='status')
+        self.status_bar.pack(side=LEFT, fill=X)
+        self.status = self.status_bar
 
     def update_status(self, evt):
         """
@@ -211,6 +325,8 @@ class MainWindow(Frame):
                                  command=self.show_foster_options)
 
         self.add_diagnostic_menu(options_menu)  # check buttons
+        options_menu.add_checkbutton(label='Separable Foster Solver',
+                                     command=self.flip_foster_solver)
         options_menu.add_separator()
         options_menu.add_command(label='Exit',
                                  command=self.exit_app)
@@ -249,6 +365,12 @@ class MainWindow(Frame):
     def flip_cauer_diagnostic(self):
         self.cauer_diagnostic = not self.cauer_diagnostic
 
+    def flip_foster_solver(self):
+        if self.foster_solver == fs.separable_solver:
+            self.foster_solver = fs.joint_solver
+        else:
+            self.foster_solver = fs.separable_solver
+
     def foster_options_form(self, window):
         option1 = Label(window, text="Foster Network Lower Limit-")
         option2 = Label(window, text="Foster Network Upper Limit-")
@@ -388,7 +510,7 @@ class MainWindow(Frame):
 
         button_accept = Button(window, text="Accept", command=self.foster_options_accept)
         button_cancel = Button(window, text="Cancel", command=lambda: window.destroy())
-        button_export = Button(window, text="Export as .txt", command=self.export_network)
+        button_export = Button(window, text="Export", command=self.export_network)
 
         button_accept.grid(row=2, column=1)
         button_cancel.grid(row=2, column=2)
@@ -404,15 +526,21 @@ class MainWindow(Frame):
         table_output.winfo_toplevel().bind('<Escape>', lambda x: table_output.destroy())
 
     def export_network(self):
-        f = asksaveasfile(mode='w', defaultextension=".txt")
-        if f is None:  # asksaveasfile return `None` if dialog closed with "cancel".
+        file_path = asksaveasfilename(defaultextension=".txt",
+                                      filetypes=[("Text table", "*.txt"), ("SPICE library", "*.lib"),
+                                                 ("SPICE circuit", "*.cir"), ("LTspice schematic", "*.asc")])
+        if not file_path:  # asksaveasfilename returns an empty string if dialog closed with "cancel".
             return
-        text2save = "Number"+"\t \t"+"Resistance"+"\t \t"+"Capacitance"+"\n"
-        for i in range(0, len(self.r_list) - 1):
-            text2save += str(i+1) + "\t \t" + str(self.r_list[i]) + "\t \t" + str(self.c_list[i]) + "\n"
-
-        f.write(text2save)
-        f.close()  # `()` was missing.
+        try:
+            if file_path.lower().endswith('.txt'):
+                with open(file_path, 'w') as f:
+                    f.write("Number" + "\t \t" + "Resistance" + "\t \t" + "Capacitance" + "\n")
+                    for i in range(len(self.r_list)):
+                        f.write(str(i + 1) + "\t \t" + str(self.r_list[i]) + "\t \t" + str(self.c_list[i]) + "\n")
+            else:
+                aw.export_network(self.rc_network, file_path, self.network_type)
+        except (fs.FC_Error_list.FosterCauer_Error, OSError) as error:
+            messagebox.showerror(title="Error", message=str(error))
 
 
 if __name__ == '__main__':
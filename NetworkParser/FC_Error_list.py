@@ -3,3 +3,10 @@ class FosterCauer_Error(Exception):
     Base Class for Exception
     """
     pass
+
+
+class FosterCauer_Cancelled(FosterCauer_Error):
+    """
+    Raised when a running solve is cancelled through its callback
+    """
+    pass
@@ -0,0 +1,194 @@
+# !/usr/bin/env python3
+# coding: utf-8
+__author__ = "Shushanth Prabhu"
+__email__ = "shushanth@gmail.com"
+__version__ = "1.0"
+
+# HEADLESS COMMAND LINE ENTRY POINT, python -m NetworkParser --help
+# DOES NOT IMPORT tkinter OR PIL SO IT RUNS ON MACHINES WITHOUT A DISPLAY
+
+from NetworkParser import foster_solver
+from NetworkParser import batch_solver
+from NetworkParser import asc_writer
+from NetworkParser import trace_tools
+from NetworkParser import FC_Error_list
+from argparse import ArgumentParser
+import json
+import sys
+
+
+def create_parser():
+    """
+    Function creating the command line parser
+    :return: ArgumentParser
+    """
+    defaults = foster_solver.foster_default_value()
+    parser = ArgumentParser(prog='python -m NetworkParser',
+                            description='Fit Foster and / or Cauer networks to Zth traces (time, Zth columns).')
+    parser.add_argument('inputs', nargs='*', default=['-'],
+                        help='CSV files, directories or glob patterns, - reads one trace from stdin (default)')
+    parser.add_argument('--network', choices=(batch_solver.foster_network, batch_solver.cauer_network,
+                                              batch_solver.both_networks),
+                        default=batch_solver.foster_network, help='Network type to fit (default foster)')
+    parser.add_argument('--format', choices=('json', 'csv', 'spice'), default='json',
+                        help='Output format (default json), spice writes one subcircuit library of all networks')
+    parser.add_argument('--name-template', default=None,
+                        help='Subcircuit names of spice output, fields {name}, {type} and {index} '
+                             '(default {name}, {type}_{name} for both networks)')
+    parser.add_argument('--node-template', default=asc_writer.spice_node_template,
+                        help='Internal node names of spice output, fields {index} and {name} (default N{index})')
+    parser.add_argument('--output', default=None, help='Output file (default stdout)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Processes for many inputs (default one per CPU)')
+
+    options = parser.add_argument_group('Foster network options')
+    options.add_argument('--lower-bound', type=float, default=defaults[0], help='Lower bound of R and C')
+    options.add_argument('--upper-bound', type=float, default=defaults[1], help='Upper bound of R and C')
+    options.add_argument('--ftol', type=float, default=defaults[2], help='Tolerance of the cost function')
+    options.add_argument('--xtol', type=float, default=defaults[3], help='Tolerance of the independent variables')
+    options.add_argument('--foster-diagnostic', action='store_true', default=defaults[4],
+                         help='Write a Foster diagnostic file per trace')
+    options.add_argument('--solver', choices=(foster_solver.joint_solver, foster_solver.separable_solver),
+                         default=defaults[foster_solver.foster_solver_index], help='Foster solver mode')
+    options.add_argument('--no-warm-start', action='store_true',
+                         help='Fit every order from the default guess')
+    options.add_argument('--stop-ratio', type=float, default=defaults[foster_solver.stop_ratio_index],
+                         help='Stop the order sweep when RMS error improves less than this ratio')
+    options.add_argument('--criterion', choices=(foster_solver.aic_criterion, foster_solver.bic_criterion),
+                         default=defaults[foster_solver.criterion_index],
+                         help='Select the order by an information criterion')
+    options.add_argument('--sweep-workers', type=int, default=defaults[foster_solver.workers_index],
+                         help='Processes for the order sweep of a single input, the orders are then fitted cold '
+                              '(implies --no-warm-start) unless the starts of --multi-start run in parallel')
+    options.add_argument('--points-per-decade', type=int, default=defaults[foster_solver.resample_index],
+                         help='Fit on a log-time resampled trace')
+    options.add_argument('--spectrum-seed', action='store_true', default=defaults[foster_solver.spectrum_seed_index],
+                         help='Fit one order seeded from the time constant spectrum instead of the order sweep')
+    options.add_argument('--multi-start', type=int, default=defaults[foster_solver.multi_start_index],
+                         help='Starts per order with log-uniform random time constants, the best fit is kept')
+    options.add_argument('--parameterization', choices=(foster_solver.linear_parameterization,
+                                                         foster_solver.log_parameterization),
+                         default=defaults[foster_solver.parameterization_index],
+                         help='Optimize R and C (linear) or log(R) and log(tau) (log)')
+    options.add_argument('--chunk-size', type=int, default=defaults[foster_solver.chunk_size_index],
+                         help='Solve on normal equations accumulated N samples at a time, memory does not grow '
+                              'with the trace length (joint solver only)')
+    options.add_argument('--float32', action='store_true', default=defaults[foster_solver.float32_index],
+                         help='Keep Zth as float32 (sums stay float64)')
+    options.add_argument('--cauer-engine', choices=('numeric', 'sympy'),
+                         default=defaults[foster_solver.cauer_engine_index], help='Foster to Cauer conversion')
+    options.add_argument('--cache-dir', default=defaults[foster_solver.cache_directory_index],
+                         help='Result cache directory')
+    options.add_argument('--no-cache', action='store_true', help='Disable the result cache')
+    options.add_argument('--cache-size', type=int, default=defaults[foster_solver.cache_size_index],
+                         help='Result cache size in bytes')
+    return parser
+
+
+def default_tuple_from_args(args):
+    """
+    Function building the default tuple from parsed arguments
+    :param args: Parsed arguments
+    :return: Tuple in the foster_default_value layout
+    """
+    default_tuple = list(foster_solver.foster_default_value())
+    default_tuple[0] = args.lower_bound
+    default_tuple[1] = args.upper_bound
+    default_tuple[2] = args.ftol
+    default_tuple[3] = args.xtol
+    default_tuple[4] = args.foster_diagnostic
+    default_tuple[foster_solver.foster_solver_index] = args.solver
+    # PARALLEL ORDERS ARE COLD FITS, A WARM STARTED SWEEP WOULD RUN SERIALLY
+    parallel_orders = (args.sweep_workers or 1) > 1 and (args.multi_start or 1) == 1
+    default_tuple[foster_solver.warm_start_index] = not (args.no_warm_start or parallel_orders)
+    default_tuple[foster_solver.stop_ratio_index] = args.stop_ratio
+    default_tuple[foster_solver.criterion_index] = args.criterion
+    default_tuple[foster_solver.workers_index] = args.sweep_workers
+    default_tuple[foster_solver.resample_index] = args.points_per_decade
+    default_tuple[foster_solver.cauer_engine_index] = args.cauer_engine
+    default_tuple[foster_solver.cache_directory_index] = None if args.no_cache else args.cache_dir
+    default_tuple[foster_solver.cache_size_index] = args.cache_size
+    default_tuple[foster_solver.spectrum_seed_index] = args.spectrum_seed
+    default_tuple[foster_solver.multi_start_index] = args.multi_start
+    default_tuple[foster_solver.parameterization_index] = args.parameterization
+    default_tuple[foster_solver.chunk_size_index] = args.chunk_size
+    default_tuple[foster_solver.float32_index] = args.float32
+    return tuple(default_tuple)
+
+
+def iter_results(inputs, default_tuple, network_type, workers):
+    """
+    Function fitting all inputs, stdin is fitted in this process
+    :param inputs: Input arguments
+    :param default_tuple: Tuple from foster_default_value
+    :param network_type: foster, cauer or both
+    :param workers: Processes for many inputs
+    :return: Generator of result dictionaries
+    """
+    sources = []
+    for item in inputs:
+        if item == '-':
+            try:
+                trace = trace_tools.load_trace_text(sys.stdin.read())
+            except FC_Error_list.FosterCauer_Error as error:
+                yield {'name': 'stdin', 'status': 'error', 'elements': None, 'error': None, 'rms_error': None,
+                       'foster': None, 'cauer': None, 'message': str(error)}
+                continue
+            yield batch_solver.fit_trace('stdin', trace, default_tuple, network_type)
+        else:
+            sources.extend(name for name, trace in batch_solver.collect_traces(item))
+
+    if len(sources) == 1:
+        yield batch_solver.fit_trace(sources[0], sources[0], default_tuple, network_type)
+    elif sources:
+        for result in batch_solver.iter_batch_networks(sources, default_tuple, network_type, workers):
+            yield result
+
+
+def record_results(results, written):
+    """
+    Function passing results through while keeping them, failed inputs are reported on stderr
+    :param results: Iterable of result dictionaries
+    :param written: List the results are appended to
+    :return: Generator of the result dictionaries
+    """
+    for result in results:
+        written.append(result)
+        if result['status'] != 'ok':
+            sys.stderr.write(result['name'] + ": " + result['message'] + "\n")
+        yield result
+
+
+def main(argv=None):
+    """
+    Command line entry point
+    :param argv: Arguments, sys.argv if None
+    :return: Exit code, 1 if any input failed
+    """
+    args = create_parser().parse_args(argv)
+    default_tuple = default_tuple_from_args(args)
+    results = iter_results(args.inputs, default_tuple, args.network, args.workers)
+
+    output_file = open(args.output, 'w', newline='') if args.output else sys.stdout
+    try:
+        if args.format == 'csv':
+            written = batch_solver.write_batch_rows(results, output_file)
+        elif args.format == 'spice':
+            written = []
+            name_template = args.name_template or ('{type}_{name}' if args.network == batch_solver.both_networks
+                                                   else asc_writer.spice_name_template)
+            asc_writer.write_spice_rows(asc_writer.batch_result_networks(record_results(results, written),
+                                                                         args.network),
+                                        output_file, name_template=name_template, node_template=args.node_template)
+        else:
+            written = list(results)
+            json.dump(written, output_file, indent=2)
+            output_file.write('\n')
+    finally:
+        if output_file is not sys.stdout:
+            output_file.close()
+    return 1 if any(result['status'] != 'ok' for result in written) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,312 @@
+# !/usr/bin/env python3
+# coding: utf-8
+__author__ = "Shushanth Prabhu"
+__email__ = "shushanth@gmail.com"
+__version__ = "1.0"
+
+# EXPORT OF FITTED NETWORKS AS SPICE SUBCIRCUITS (.lib / .cir) AND LTSPICE SCHEMATICS (.asc)
+# EVERY NETWORK IS A TWO PORT SUBCIRCUIT, POWER IS A CURRENT INTO THE JUNCTION PORT AND THE AMBIENT PORT IS HELD AT
+# THE AMBIENT TEMPERATURE. CAUER CAPACITANCES ARE CONNECTED TO THE AMBIENT PORT, AS IN cauer_solver.cauer_state_matrix.
+# LIBRARIES ARE WRITTEN ONE SUBCIRCUIT AT A TIME, SO A WHOLE LOT OF NETWORKS NEVER HAS TO BE IN MEMORY.
+
+from NetworkParser import network_types
+from NetworkParser import FC_Error_list
+from numpy import asarray, isfinite
+from os import path
+import re
+
+# PORT NAMES OF THE SUBCIRCUITS
+spice_junction_node = 'TJ'
+spice_ambient_node = 'TA'
+# INTERNAL NODE NAMES, FIELDS index (1 BASED) AND name (SUBCIRCUIT NAME)
+spice_node_template = 'N{index}'
+# SUBCIRCUIT NAMES, FIELDS name, type (foster OR cauer) AND index (1 BASED POSITION IN THE LIBRARY)
+spice_name_template = '{name}'
+# FILE EXTENSIONS WRITTEN AS SPICE SUBCIRCUITS
+spice_extensions = ('.lib', '.cir', '.sub', '.inc')
+# GRID OF ONE RC STAGE IN AN LTSPICE SCHEMATIC
+asc_stage_width = 128
+asc_ambient_row = 160
+
+
+def spice_name(name):
+    """
+    Function turning a trace name or file path into a SPICE identifier
+    :param name: Name or file path, the directory and extension of a path are dropped
+    :return: Name with characters other than letters, digits and _ replaced by _
+    """
+    name = re.sub(r'[^A-Za-z0-9_]', '_', path.splitext(path.basename(str(name)))[0])
+    if not name:
+        raise FC_Error_list.FosterCauer_Error("Network name is empty")
+    return name
+
+
+def spice_value(value):
+    """
+    Function formatting a component value without losing precision
+    :param value: R or C value
+    :return: Value as text
+    """
+    return repr(float(value))
+
+
+def check_network(network):
+    """
+    Function validating a network before it is exported
+    :param network: Foster or Cauer network list
+    :return: Network as float array
+    """
+    network = asarray(network, dtype=float).ravel()
+    if len(network) < 2 or len(network) % 2 or not isfinite(network).all() or (network <= 0).any():
+        raise FC_Error_list.FosterCauer_Error("Network must contain positive R and C pairs")
+    return network
+
+
+def network_nodes(count_elements, name, node_template=spice_node_template, junction=spice_junction_node,
+                  ambient=spice_ambient_node):
+    """
+    Function returning the node names along a network, junction first and ambient last
+    :param count_elements: Number of RC pairs
+    :param name: Subcircuit name, available to the template as {name}
+    :param node_template: Template of the internal node names
+    :param junction: Junction port name
+    :param ambient: Ambient port name
+    :return: List of count_elements + 1 node names
+    """
+    nodes = [junction] + [node_template.format(index=index, name=name) for index in range(1, count_elements)]
+    nodes.append(ambient)
+    if len(set(nodes)) != len(nodes):
+        raise FC_Error_list.FosterCauer_Error("Node template " + node_template + " does not give unique node names")
+    return nodes
+
+
+def foster_subcircuit(foster_network, name, node_template=spice_node_template, junction=spice_junction_node,
+                      ambient=spice_ambient_node):
+    """
+    Function returning the SPICE lines of a Foster network, parallel RC pairs in series from junction to ambient
+    :param foster_network: RC tuple with R Value First and C Value Seconds
+    :param name: Subcircuit name
+    :param node_template: Template of the internal node names
+    :param junction: Junction port name
+    :param ambient: Ambient port name
+    :return: Generator of lines without line end
+    """
+    foster_network = check_network(foster_network)
+    count_elements = len(foster_network) // 2
+    nodes = network_nodes(count_elements, name, node_template, junction, ambient)
+    yield "* Foster network " + name + ", " + str(count_elements) + " RC pairs"
+    yield ".subckt " + name + " " + junction + " " + ambient
+    for i in range(count_elements):
+        yield "R" + str(i + 1) + " " + nodes[i] + " " + nodes[i + 1] + " " + spice_value(foster_network[2 * i])
+        yield "C" + str(i + 1) + " " + nodes[i] + " " + nodes[i + 1] + " " + spice_value(foster_network[2 * i + 1])
+    yield ".ends " + name
+
+
+def cauer_subcircuit(cauer_network, name, node_template=spice_node_template, junction=spice_junction_node,
+                     ambient=spice_ambient_node):
+    """
+    Function returning the SPICE lines of a Cauer ladder, series R with C from every node to ambient
+    :param cauer_network: Cauer network list with C Value First and R Value Seconds, the last R goes to ambient
+    :param name: Subcircuit name
+    :param node_template: Template of the internal node names
+    :param junction: Junction port name
+    :param ambient: Ambient port name
+    :return: Generator of lines without line end
+    """
+    cauer_network = check_network(cauer_network)
+    count_elements = len(cauer_network) // 2
+    nodes = network_nodes(count_elements, name, node_template, junction, ambient)
+    yield "* Cauer network " + name + ", " + str(count_elements) + " RC pairs"
+    yield ".subckt " + name + " " + junction + " " + ambient
+    for i in range(count_elements):
+        yield "C" + str(i + 1) + " " + nodes[i] + " " + ambient + " " + spice_value(cauer_network[2 * i])
+        yield "R" + str(i + 1) + " " + nodes[i] + " " + nodes[i + 1] + " " + spice_value(cauer_network[2 * i + 1])
+    yield ".ends " + name
+
+
+def spice_subcircuit(network, network_type, name, node_template=spice_node_template, junction=spice_junction_node,
+                     ambient=spice_ambient_node):
+    """
+    Function returning the SPICE lines of a Foster or Cauer network
+    :param network: Network list
+    :param network_type: foster or cauer
+    :param name: Subcircuit name
+    :param node_template: Template of the internal node names
+    :param junction: Junction port name
+    :param ambient: Ambient port name
+    :return: Generator of lines without line end
+    """
+    if network_type == network_types.foster_network:
+        return foster_subcircuit(network, name, node_template, junction, ambient)
+    elif network_type == network_types.cauer_network:
+        return cauer_subcircuit(network, name, node_template, junction, ambient)
+    raise FC_Error_list.FosterCauer_Error("Unknown network type " + str(network_type))
+
+
+def write_spice_rows(networks, f, network_type=network_types.foster_network, name_template=spice_name_template,
+                     node_template=spice_node_template, junction=spice_junction_node, ambient=spice_ambient_node):
+    """
+    Function writing networks as SPICE subcircuits to an open file as they arrive
+    :param networks: Iterable of (name, network) or (name, network type, network) tuples
+    :param f: Text file object
+    :param network_type: Network type of (name, network) tuples, foster or cauer
+    :param name_template: Template of the subcircuit names, fields name (see spice_name), type and index
+    :param node_template: Template of the internal node names, fields index and name
+    :param junction: Junction port name
+    :param ambient: Ambient port name
+    :return: Number of written subcircuits
+    """
+    names = set()
+    count = 0
+    f.write("* RC_1D_Network thermal models, ports " + junction + " (junction) and " + ambient + " (ambient)\n")
+    for item in networks:
+        if len(item) == 3:
+            name, item_type, network = item
+        else:
+            (name, network), item_type = item, network_type
+        subcircuit_name = spice_name(name_template.format(name=spice_name(name), type=item_type, index=count + 1))
+        if subcircuit_name in names:
+            raise FC_Error_list.FosterCauer_Error("Subcircuit " + subcircuit_name + " is written twice, "
+                                                  "add {type} or {index} to the name template")
+        names.add(subcircuit_name)
+        f.write("\n")
+        for line in spice_subcircuit(network, item_type, subcircuit_name, node_template, junction, ambient):
+            f.write(line + "\n")
+        count += 1
+    return count
+
+
+def write_spice_library(networks, file, network_type=network_types.foster_network, name_template=spice_name_template,
+                        node_template=spice_node_template, junction=spice_junction_node, ambient=spice_ambient_node):
+    """
+    Function writing networks as SPICE subcircuits to a library file (.lib or .cir), see write_spice_rows
+    :param networks: Iterable of (name, network) or (name, network type, network) tuples, may be a generator
+    :param file: Library file path
+    :param network_type: Network type of (name, network) tuples, foster or cauer
+    :param name_template: Template of the subcircuit names, fields name, type and index
+    :param node_template: Template of the internal node names, fields index and name
+    :param junction: Junction port name
+    :param ambient: Ambient port name
+    :return: Number of written subcircuits
+    """
+    with open(file, 'w') as f:
+        return write_spice_rows(networks, f, network_type, name_template, node_template, junction, ambient)
+
+
+def batch_result_networks(results, network_type=network_types.foster_network):
+    """
+    Function turning batch results into library entries, failed traces are skipped
+    :param results: Iterable of result dictionaries (see batch_solver.fit_trace)
+    :param network_type: foster, cauer or both
+    :return: Generator of (name, network type, network) tuples
+    """
+    types = (network_types.foster_network, network_types.cauer_network) \
+        if network_type == network_types.both_networks else (network_type,)
+    for result in results:
+        if result['status'] != 'ok':
+            continue
+        for item_type in types:
+            if result[item_type] is not None:
+                yield result['name'], item_type, result[item_type]
+
+
+def asc_lines(wires, flags, symbols):
+    """
+    Function returning the lines of an LTspice schematic
+    :param wires: List of (x1, y1, x2, y2)
+    :param flags: List of (x, y, net name, port)
+    :param symbols: List of (symbol, x, y, rotation, instance name, value)
+    :return: List of lines without line end
+    """
+    lines = ["Version 4", "SHEET 1 " + str(max([x for wire in wires for x in wire[0::2]]) + 160) + " 320"]
+    lines.extend("WIRE " + " ".join(str(i) for i in wire) for wire in wires)
+    for x, y, net, port in flags:
+        lines.append("FLAG " + str(x) + " " + str(y) + " " + net)
+        if port:
+            lines.append("IOPIN " + str(x) + " " + str(y) + " BiDir")
+    for symbol, x, y, rotation, name, value in symbols:
+        lines.extend(("SYMBOL " + symbol + " " + str(x) + " " + str(y) + " " + rotation,
+                      "SYMATTR InstName " + name, "SYMATTR Value " + spice_value(value)))
+    return lines
+
+
+def write_asc(file, lines):
+    """
+    Function writing the lines of an LTspice schematic
+    :param file: .asc file path
+    :param lines: Lines from asc_lines
+    :return: File path
+    """
+    with open(file, 'w') as f:
+        f.write("\n".join(lines) + "\n")
+    return file
+
+
+def write_foster(file, foster_network, junction=spice_junction_node, ambient=spice_ambient_node):
+    """
+    Function writing a Foster network as LTspice schematic, the stages run left to right from junction to ambient
+    with R on top of C
+    :param file: .asc file path
+    :param foster_network: RC tuple with R Value First and C Value Seconds
+    :param junction: Junction port name
+    :param ambient: Ambient port name
+    :return: File path
+    """
+    foster_network = check_network(foster_network)
+    count_elements = len(foster_network) // 2
+    wires, symbols = [(0, 0, 0, 64)], []
+    for i in range(count_elements):
+        x = i * asc_stage_width
+        # res R90 PINS AT (X - 96, Y + 16) AND (X - 16, Y + 16), cap R90 AT (X - 64, Y + 16) AND (X, Y + 16)
+        symbols.append(('res', x + 120, -16, 'R90', 'R' + str(i + 1), foster_network[2 * i]))
+        symbols.append(('cap', x + 96, 48, 'R90', 'C' + str(i + 1), foster_network[2 * i + 1]))
+        wires.extend(((x, 0, x + 24, 0), (x + 104, 0, x + 128, 0), (x, 64, x + 32, 64), (x + 96, 64, x + 128, 64),
+                      (x + 128, 0, x + 128, 64)))
+    flags = [(0, 0, junction, True), (count_elements * asc_stage_width, 0, ambient, True)]
+    return write_asc(file, asc_lines(wires, flags, symbols))
+
+
+def write_cauer(file, cauer_network, junction=spice_junction_node, ambient=spice_ambient_node):
+    """
+    Function writing a Cauer ladder as LTspice schematic, the series R run left to right from junction to ambient
+    and every C goes down to the ambient rail
+    :param file: .asc file path
+    :param cauer_network: Cauer network list with C Value First and R Value Seconds, the last R goes to ambient
+    :param junction: Junction port name
+    :param ambient: Ambient port name
+    :return: File path
+    """
+    cauer_network = check_network(cauer_network)
+    count_elements = len(cauer_network) // 2
+    end = count_elements * asc_stage_width
+    wires, symbols = [(0, asc_ambient_row, end, asc_ambient_row), (end, 0, end, asc_ambient_row)], []
+    for i in range(count_elements):
+        x = i * asc_stage_width
+        # cap R0 PINS AT (X + 16, Y) AND (X + 16, Y + 64)
+        symbols.append(('cap', x - 16, 48, 'R0', 'C' + str(i + 1), cauer_network[2 * i]))
+        symbols.append(('res', x + 120, -16, 'R90', 'R' + str(i + 1), cauer_network[2 * i + 1]))
+        wires.extend(((x, 0, x, 48), (x, 112, x, asc_ambient_row), (x, 0, x + 24, 0), (x + 104, 0, x + 128, 0)))
+    flags = [(0, 0, junction, True), (end, asc_ambient_row, ambient, True)]
+    return write_asc(file, asc_lines(wires, flags, symbols))
+
+
+def export_network(network, file, network_type=network_types.foster_network, name=None):
+    """
+    Function exporting one network, the format follows the file extension (.asc or .lib, .cir, .sub, .inc)
+    :param network: Network list
+    :param file: Output file path
+    :param network_type: foster or cauer
+    :param name: Subcircuit name, taken from the file name if None
+    :return: File path
+    """
+    extension = path.splitext(file)[1].lower()
+    if extension == '.asc':
+        if network_type == network_types.foster_network:
+            return write_foster(file, network)
+        elif network_type == network_types.cauer_network:
+            return write_cauer(file, network)
+        raise FC_Error_list.FosterCauer_Error("Unknown network type " + str(network_type))
+    elif extension in spice_extensions:
+        write_spice_library([(name or file, network)], file, network_type)
+        return file
+    raise FC_Error_list.FosterCauer_Error("Unknown export format " + extension)
@@ -0,0 +1,167 @@
+# !/usr/bin/env python3
+# coding: utf-8
+__author__ = "Shushanth Prabhu"
+__email__ = "shushanth@gmail.com"
+__version__ = "1.0"
+
+from NetworkParser import foster_solver
+from NetworkParser import cauer_solver
+from NetworkParser import FC_Error_list
+from NetworkParser import network_types
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from glob import glob, has_magic
+from os import path
+from numpy import asarray
+import csv
+
+# NETWORK TYPES OF A BATCH RUN (see network_types)
+foster_network = network_types.foster_network
+cauer_network = network_types.cauer_network
+both_networks = network_types.both_networks
+
+batch_table_header = ["Name", "Status", "Number of Elements", "Error", "RMS Error", "Foster Network",
+                      "Cauer Network", "Message"]
+
+
+def collect_traces(source):
+    """
+    Function to list the traces of a batch
+    :param source: Directory, glob pattern, CSV file or list of CSV files and / or (time, Zth) arrays
+    :return: List of (name, file or array) tuples
+    """
+    if isinstance(source, str):
+        if path.isdir(source):
+            files = sorted(glob(path.join(source, '*.csv')))
+        elif has_magic(source):
+            files = sorted(glob(source))
+        else:
+            files = [source]
+        return [(file, file) for file in files]
+
+    traces = []
+    for counter, item in enumerate(source):
+        if isinstance(item, str):
+            traces.append((item, item))
+        else:
+            traces.append(("trace_" + str(counter + 1), item))
+    return traces
+
+
+def fit_trace(name, trace, default_tuple, network_type=foster_network):
+    """
+    Function to fit one trace of a batch, errors are returned instead of raised
+    :param name: Name of the trace
+    :param trace: CSV file or array with time in the first and Zth in the second column
+    :param default_tuple: Tuple from foster_default_value
+    :param network_type: foster, cauer or both
+    :return: Dictionary with the result of the trace
+    """
+    result = {'name': name, 'status': 'ok', 'elements': None, 'error': None, 'rms_error': None,
+              'foster': None, 'cauer': None, 'message': ''}
+    try:
+        if isinstance(trace, str):
+            time, zth = foster_solver.read_csv_columns(
+                trace, foster_solver.get_default_option(default_tuple, foster_solver.float32_index, False))
+        else:
+            trace = asarray(trace, dtype=float)
+            time = trace[:, 0]
+            zth = trace[:, 1]
+        if foster_solver.sanity_check(time, zth):
+            network, table, report = foster_solver.cached_foster_network(time, zth, default_tuple)
+            result['foster'] = [float(i) for i in network]
+            for row in table:
+                if row[1] == result['foster']:
+                    result['elements'] = row[0]
+                    result['error'] = row[2]
+                    result['rms_error'] = row[3]
+            if network_type in (cauer_network, both_networks):
+                engine = foster_solver.get_default_option(default_tuple, foster_solver.cauer_engine_index,
+                                                          cauer_solver.numeric_engine)
+                result['cauer'] = [float(i) for i in cauer_solver.foster_to_cauer(network, engine)]
+            if network_type == cauer_network:
+                result['foster'] = None
+    except FC_Error_list.FosterCauer_Error as error:
+        result['status'] = 'error'
+        result['message'] = str(error)
+    except Exception as error:
+        result['status'] = 'error'
+        result['message'] = type(error).__name__ + ": " + str(error)
+    return result
+
+
+def iter_batch_networks(source, default_tuple=None, network_type=foster_network, workers=None):
+    """
+    Function fitting a batch of traces on a process pool, results are yielded as they finish
+    :param source: Directory, glob pattern, CSV file or list of CSV files and / or arrays
+    :param default_tuple: Tuple from foster_default_value
+    :param network_type: foster, cauer or both
+    :param workers: Number of processes, one per CPU if None
+    :return: Generator of result dictionaries (see fit_trace)
+    """
+    if network_type not in (foster_network, cauer_network, both_networks):
+        raise FC_Error_list.FosterCauer_Error("Unknown network type " + str(network_type))
+    default_tuple = tuple(default_tuple or foster_solver.foster_default_value())
+    # THE BATCH IS ALREADY PARALLEL, EVERY SWEEP RUNS IN ITS OWN WORKER
+    if len(default_tuple) > foster_solver.workers_index:
+        default_tuple = default_tuple[:foster_solver.workers_index] + (1,) + \
+                        default_tuple[foster_solver.workers_index + 1:]
+
+    traces = collect_traces(source)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(fit_trace, name, trace, default_tuple, network_type) for name, trace in traces]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def format_network(network):
+    """
+    Function to format a network for the result table
+    :param network: RC list or None
+    :return: Space separated values
+    """
+    if network is None:
+        return ""
+    return " ".join(repr(i) for i in network)
+
+
+def write_batch_rows(results, f):
+    """
+    Function writing batch results as CSV rows to an open file as they arrive
+    :param results: Iterable of result dictionaries
+    :param f: Text file object
+    :return: List of the result dictionaries
+    """
+    written = []
+    writer = csv.writer(f)
+    writer.writerow(batch_table_header)
+    for result in results:
+        writer.writerow([result['name'], result['status'], result['elements'], result['error'],
+                         result['rms_error'], format_network(result['foster']),
+                         format_network(result['cauer']), result['message']])
+        f.flush()
+        written.append(result)
+    return written
+
+
+def write_batch_table(results, output_file):
+    """
+    Function writing batch results to a CSV table as they arrive
+    :param results: Iterable of result dictionaries
+    :param output_file: CSV file path
+    :return: List of the result dictionaries
+    """
+    with open(output_file, 'w', newline='') as f:
+        return write_batch_rows(results, f)
+
+
+def fit_batch(source, output_file, default_tuple=None, network_type=foster_network, workers=None):
+    """
+    Function fitting a batch of traces and writing one consolidated result table
+    :param source: Directory, glob pattern, CSV file or list of CSV files and / or arrays
+    :param output_file: CSV file path of the result table
+    :param default_tuple: Tuple from foster_default_value
+    :param network_type: foster, cauer or both
+    :param workers: Number of processes, one per CPU if None
+    :return: List of result dictionaries in the order they finished
+    """
+    return write_batch_table(iter_batch_networks(source, default_tuple, network_type, workers), output_file)
@@ -6,7 +6,13 @@ __version__ = "1.0"
 
 from NetworkParser import foster_solver
 from NetworkParser import FC_Error_list
+from NetworkParser import result_cache
+from NetworkParser import instrumentation
+from NetworkParser import network_types
+from NetworkParser import asc_writer
+from time import perf_counter
 import numpy as np
+from numpy import longdouble, sqrt, einsum, errstate
 # import matplotlib.pyplot as plt
 from sympy import symbols, fraction, cancel, quo
 from sympy import Poly, rem
@@ -17,6 +23,12 @@ from sympy import Poly, rem
 # TODO : Idiot proof
 # 200 Hz is the ideal PWM
 
+# FOSTER TO CAUER CONVERSION ENGINES
+numeric_engine = 'numeric'
+sympy_engine = 'sympy'
+# BUMP WHENEVER THE CONVERSION GIVES OTHER NETWORKS, IT IS PART OF THE CACHE KEY WITH foster_solver_version
+cauer_solver_version = 1
+
 def read_csv_file(file):
     """
     Read CSV File
@@ -51,53 +63,185 @@ def read_csv_file(file):
 #     plt.show()
 
 
-def solve_cauer(time, zth, default_tuple):
+def foster_to_cauer(foster_network, engine=numeric_engine):
+    """
+    Function to convert a Foster network to a Cauer network
+    :param foster_network: Foster RC tuple with R Value First and C Value Seconds
+    :param engine: numeric (Lanczos tridiagonalization) or sympy (symbolic continued fraction, reference)
+    :return: Cauer network list with C Value First and R Value Seconds
+    """
+    if engine == numeric_engine:
+        return [float(i) for i in foster_to_cauer_numeric(foster_network)]
+    elif engine == sympy_engine:
+        return foster_to_cauer_sympy(foster_network)
+    raise FC_Error_list.FosterCauer_Error("Unknown Cauer engine " + str(engine))
+
+
+def foster_to_cauer_numeric(foster_networks):
+    """
+    Function to convert Foster networks to Cauer networks without symbolic algebra.
+    The Foster impedance sum(R / (1 + s R C)) is the state space model diag(1 / tau) with input weights
+    1 / sqrt(C). A Lanczos tridiagonalization in extended precision, started from the input weights, turns it
+    into the symmetric tridiagonal model of the Cauer ladder, from which C and R are read node by node.
+    :param foster_networks: Foster RC tuple, or array with one Foster RC tuple of the same order per row
+    :return: Cauer networks with C Value First and R Value Seconds, in the shape of the input
+    """
+    foster_networks = np.asarray(foster_networks, dtype=float)
+    networks = np.atleast_2d(foster_networks).astype(longdouble)
+    count_networks, count_elements = networks.shape[0], networks.shape[1] // 2
+    foster_r = networks[:, 0::2]
+    foster_c = networks[:, 1::2]
+    eigenvalues = 1 / (foster_r * foster_c)
+    weights = 1 / sqrt(foster_c)
+
+    # LANCZOS WITH FULL REORTHOGONALIZATION, ONE NETWORK PER ROW
+    basis = np.zeros((count_networks, count_elements, count_elements), dtype=longdouble)
+    alpha = np.zeros((count_networks, count_elements), dtype=longdouble)
+    beta = np.zeros((count_networks, count_elements), dtype=longdouble)
+    weight_norm = sqrt((weights * weights).sum(axis=1))
+    vector = weights / weight_norm[:, None]
+    with errstate(divide='ignore', invalid='ignore'):
+        for k in range(count_elements):
+            basis[:, :, k] = vector
+            product = eigenvalues * vector
+            alpha[:, k] = (vector * product).sum(axis=1)
+            for _ in range(2):
+                product -= einsum('bik,bk->bi', basis[:, :, :k + 1],
+                                  einsum('bik,bi->bk', basis[:, :, :k + 1], product))
+            if k + 1 < count_elements:
+                beta[:, k] = sqrt((product * product).sum(axis=1))
+                vector = product / beta[:, k, None]
+
+        # LADDER ELEMENTS FROM THE TRIDIAGONAL MATRIX
+        cauer_c = np.zeros((count_networks, count_elements), dtype=longdouble)
+        cauer_g = np.zeros((count_networks, count_elements), dtype=longdouble)
+        cauer_c[:, 0] = 1 / (weight_norm * weight_norm)
+        cauer_g[:, 0] = alpha[:, 0] * cauer_c[:, 0]
+        for k in range(1, count_elements):
+            cauer_c[:, k] = cauer_g[:, k - 1] ** 2 / (beta[:, k - 1] ** 2 * cauer_c[:, k - 1])
+            cauer_g[:, k] = alpha[:, k] * cauer_c[:, k] - cauer_g[:, k - 1]
+
+        cauer_networks = np.empty(networks.shape, dtype=float)
+        cauer_networks[:, 0::2] = cauer_c
+        cauer_networks[:, 1::2] = 1 / cauer_g
+    return cauer_networks.reshape(foster_networks.shape)
+
+
+def cauer_state_matrix(cauer_networks):
+    """
+    Function building the symmetric tridiagonal state matrix C^-1/2 G C^-1/2 of Cauer ladders
+    :param cauer_networks: Cauer network list, or array with one Cauer network of the same order per row
+    :return: Array of state matrices with one matrix per ladder, and the node capacitances
+    """
+    networks = np.atleast_2d(np.asarray(cauer_networks, dtype=float))
+    cauer_c = networks[:, 0::2]
+    cauer_g = 1 / networks[:, 1::2]
+    count_elements = cauer_c.shape[1]
+    # CONDUCTANCE TO THE PREVIOUS NODE, THE FIRST NODE IS THE JUNCTION
+    previous_g = np.zeros_like(cauer_g)
+    previous_g[:, 1:] = cauer_g[:, :-1]
+    diagonal = (previous_g + cauer_g) / cauer_c
+    off_diagonal = -cauer_g[:, :-1] / np.sqrt(cauer_c[:, :-1] * cauer_c[:, 1:])
+
+    state_matrix = np.zeros((networks.shape[0], count_elements, count_elements))
+    index = np.arange(count_elements)
+    state_matrix[:, index, index] = diagonal
+    state_matrix[:, index[:-1], index[1:]] = off_diagonal
+    state_matrix[:, index[1:], index[:-1]] = off_diagonal
+    return state_matrix, cauer_c
+
+
+def cauer_to_foster(cauer_networks):
+    """
+    Function to convert Cauer ladders to Foster networks by a symmetric eigen-decomposition.
+    Every eigenvalue of the ladder state matrix is one Foster time constant 1 / tau, the first component of its
+    eigenvector gives the Foster capacitance C1 / v^2.
+    :param cauer_networks: Cauer network list, or array with one Cauer network of the same order per row
+    :return: Foster RC tuples with R Value First and C Value Seconds, in the shape of the input
+    """
+    cauer_networks = np.asarray(cauer_networks, dtype=float)
+    state_matrix, cauer_c = cauer_state_matrix(cauer_networks)
+    eigenvalues, eigenvectors = np.linalg.eigh(state_matrix)
+    tau = 1 / eigenvalues
+    foster_c = cauer_c[:, :1] / (eigenvectors[:, 0, :] ** 2)
+
+    foster_networks = np.empty(state_matrix.shape[:1] + (2 * state_matrix.shape[1],))
+    foster_networks[:, 0::2] = tau / foster_c
+    foster_networks[:, 1::2] = foster_c
+    return foster_networks.reshape(cauer_networks.shape)
+
+
+def foster_to_cauer_sympy(foster_network):
+    """
+    Function to convert a Foster network to a Cauer network by symbolic continued fraction expansion
+    :param foster_network: Foster RC tuple with R Value First and C Value Seconds
+    :return: Cauer network list with C Value First and R Value Seconds
+    """
+    s = symbols('s')
+    i = 0
+    f = 0
+    while i != len(foster_network):
+        f += (foster_network[i] / (1 + (foster_network[i] * foster_network[i + 1]) * s))
+        i += 2
+
+    sum_f = 1 / f
+    n, d = fraction(cancel(sum_f))
+    cauer_network = []
+    flag = True
+
+    while flag:
+        q = quo(n, d)
+        c = Poly(q, s).all_coeffs()[0]
+        q_list = Poly(q, s).all_coeffs()
+        cauer_network.append(c)
+
+        q_list.pop(0)
+        re = rem(n, d)
+        if len(q_list) == 1:
+            n = q_list[0] * d
+        n = n + re
+        n, d = fraction(d / n)
+        if len(Poly(d, s).all_coeffs()) == 1:
+            r = n / d
+        else:
+            r = quo(n, d)
+
+        cauer_network.append(r)
+        if len(foster_network) == len(cauer_network):
+            flag = False
+            break
+        re = rem(n, d)
+        n = re
+        n, d = fraction(d / n)
+    return cauer_network
+
+
+def solve_cauer(time, zth, default_tuple, callback=None, return_report=False, max_elements=None):
     """
     Function to create a cauer model
     :param time:
     :param zth:
+    :param default_tuple: Tuple from foster_default_value, the Cauer engine is read from it
+    :param callback: Progress callback of create_foster_network, also called with stage cauer before the
+                     conversion
+    :param return_report: Also return the run report of create_foster_network with the cauer_conversion stage
+    :param max_elements: Max number of allowed elements of the Foster sweep (see create_foster_network)
     :return:
     """
     if foster_solver.sanity_check(time, zth):
-        foster_network = foster_solver.create_foster_network(time, zth, default_tuple)
+        start = perf_counter()
+        foster_network, report = foster_solver.create_foster_network(time, zth, default_tuple, max_elements,
+                                                                     callback=callback, return_report=True)
         # plot_zth(zth, foster_network)
         # print(foster_network)
-        s = symbols('s')
-        i = 0
-        f = 0
-        while i != len(foster_network):
-            f += (foster_network[i] / (1 + (foster_network[i] * foster_network[i + 1]) * s))
-            i += 2
-
-        sum_f = 1 / f
-        n, d = fraction(cancel(sum_f))
-        cauer_network = []
-        flag = True
-
-        while flag:
-            q = quo(n, d)
-            c = Poly(q, s).all_coeffs()[0]
-            q_list = Poly(q, s).all_coeffs()
-            cauer_network.append(c)
-
-            q_list.pop(0)
-            re = rem(n, d)
-            if len(q_list) == 1:
-                n = q_list[0] * d
-            n = n + re
-            n, d = fraction(d / n)
-            if len(Poly(d, s).all_coeffs()) == 1:
-                r = n / d
-            else:
-                r = quo(n, d)
-
-            cauer_network.append(r)
-            if len(foster_network) == len(cauer_network):
-                flag = False
-                break
-            re = rem(n, d)
-            n = re
-            n, d = fraction(d / n)
+        engine = foster_solver.get_default_option(default_tuple, foster_solver.cauer_engine_index, numeric_engine)
+        if callback is not None:
+            callback({'stage': 'cauer', 'order': len(foster_network) // 2})
+        with instrumentation.stage_timer(report, 'cauer_conversion'):
+            cauer_network = foster_to_cauer(foster_network, engine)
+        report['total_time'] = perf_counter() - start
+        if return_report:
+            return cauer_network, report
         return cauer_network
 
 
@@ -111,17 +255,77 @@ def sort_rc_list(network):
     return (list_1, list_2)
 
 
-def get_cauer_network(file):
+def get_cauer_network(file, default_values=None, callback=None, return_report=False):
+    """
+    Function to create a Cauer network from a CSV file, reusing cached Foster and Cauer results
+    :param file: CSV File
+    :param default_values: Tuple from foster_default_value, foster_default_value() if None
+    :param callback: Progress callback of solve_cauer
+    :param return_report: Also return the run report (see instrumentation.new_report)
+    :return: Cauer network list with C Value First and R Value Seconds
+    """
     if file.strip() or not file.isspace():
-        zth = read_csv_file(file)
-        zth = np.asarray(zth)
+        start = perf_counter()
+        report = instrumentation.new_report()
+        default_values = default_values or foster_solver.foster_default_value()
+        with instrumentation.stage_timer(report, 'parse'):
+            time, zth = foster_solver.read_csv_columns(file, foster_solver.get_default_option(
+                default_values, foster_solver.float32_index, False))
 
-        cauer_network = solve_cauer(zth[:, 0], zth[:, 1], foster_solver.foster_default_value())
-        return cauer_network
+        directory = foster_solver.cache_directory(default_values)
+        key = None
+        if directory is not None:
+            key = result_cache.trace_key('cauer', (time, zth), foster_solver.cache_settings(default_values),
+                                         (foster_solver.foster_solver_version, cauer_solver_version))
+            with instrumentation.stage_timer(report, 'cache'):
+                cached = result_cache.load_result(directory, key)
+            if cached is not None:
+                report['cache'] = 'hit'
+                report['selected_order'] = len(cached['network']) // 2
+                report['total_time'] = perf_counter() - start
+                if return_report:
+                    return cached['network'], report
+                return cached['network']
+
+        with instrumentation.stage_timer(report, 'sanity'):
+            valid = foster_solver.sanity_check(time, zth)
+        if valid:
+            foster_network, table, foster_report = foster_solver.cached_foster_network(time, zth, default_values,
+                                                                                       callback)
+            # THE FOSTER REPORT HOLDS THE SWEEP, THE STAGES OF THIS FUNCTION ARE ADDED TO IT
+            for name, wall_time in report['stages'].items():
+                foster_report['stages'][name] = foster_report['stages'].get(name, 0.0) + wall_time
+            report = foster_report
+            # cache IS THE CAUER LOOKUP, THE FOSTER LOOKUP IS KEPT APART
+            report['foster_cache'] = foster_report['cache']
+            report['cache'] = 'disabled' if directory is None else 'miss'
+            engine = foster_solver.get_default_option(default_values, foster_solver.cauer_engine_index,
+                                                      numeric_engine)
+            if callback is not None:
+                callback({'stage': 'cauer', 'order': len(foster_network) // 2})
+            with instrumentation.stage_timer(report, 'cauer_conversion'):
+                cauer_network = foster_to_cauer(foster_network, engine)
+            if directory is not None:
+                with instrumentation.stage_timer(report, 'cache'):
+                    result_cache.store_result(directory, key, {'network': [float(i) for i in cauer_network],
+                                                               'foster': [float(i) for i in foster_network]},
+                                              foster_solver.get_default_option(default_values,
+                                                                               foster_solver.cache_size_index, 0))
+            report['total_time'] = perf_counter() - start
+            if return_report:
+                return cauer_network, report
+            return cauer_network
 
-def export_network(list1,list2):
-    print ("Hi")
 
+def export_network(cauer_network, file, name=None):
+    """
+    Function to export a Cauer network as LTspice schematic (.asc) or SPICE subcircuit (.lib, .cir)
+    :param cauer_network: Cauer network list with C Value First and R Value Seconds
+    :param file: Output file path, the extension selects the format
+    :param name: Subcircuit name, taken from the file name if None
+    :return: File path
+    """
+    return asc_writer.export_network(cauer_network, file, network_types.cauer_network, name)
 
 
 if __name__ == "__main__":
@@ -148,5 +352,4 @@ if __name__ == "__main__":
     cir_file_path = r"C:\Users\ocu01756\OneDrive - Osram-Continental GmbH\Documents\personal\Papers\RC_Network\FosterNetwork\ExampleCircuit\SW_Validation"
     cir_file_path += r"\Cauer_Circuit.asc"
 
-    # from NetworkParser import asc_writer as cir
-    # cir.write_cauer(cir_file_path,cauer_network)
+    export_network(cauer_network, cir_file_path)
@@ -4,14 +4,30 @@ __author__ = "Shushanth Prabhu"
 __email__ = "shushanth@gmail.com"
 __version__ = "1.0"
 
-from scipy.optimize import least_squares
-from numpy import exp, inf, asarray
-from math import sqrt
-from openpyxl import Workbook, load_workbook
+from scipy.optimize import least_squares, lsq_linear
+from numpy import exp, inf, asarray, empty, clip, logspace, column_stack, flatnonzero, errstate, log as np_log
+from numpy import ndarray, float64, diff, full, nan, savez_compressed, sort, zeros
+from numpy import diag, outer, finfo, eye, isfinite, ix_
+from numpy import sqrt as sqrt_array
+from numpy import log10 as np_log10
+from numpy.random import default_rng
+from numpy.linalg import lstsq, norm
+from scipy.optimize import OptimizeResult
+from scipy.linalg import eigh
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager, ExitStack
+from multiprocessing import shared_memory
+from math import sqrt, log
+from openpyxl import Workbook
 from NetworkParser import FC_Error_list
-from os.path import exists
-from os import remove
-from os import path
+from NetworkParser import trace_tools
+from NetworkParser import result_cache
+from NetworkParser import instrumentation
+from NetworkParser import time_constant_spectrum
+from os import path, getpid
+from time import strftime, perf_counter
+from uuid import uuid4
+import warnings
 
 # from matplotlib import pyplot as plt
 # from matplotlib.ticker import (MultipleLocator, FormatStrFormatter,
@@ -20,11 +36,57 @@ from math import log10
 
 # TODO : if exact solution is known can we evaluate max error
 # TODO : In Diagfile create Plots
-# TODO : Export Circuite to *.asc file
 
 maximum_network_elements = 10
 diagnostic_filename = 'Foster_Diagnostic.xlsx'
 
+# BUMP WHENEVER THE FITTED NETWORKS CHANGE FOR THE SAME TRACE AND SETTINGS, IT IS PART OF THE CACHE KEY
+foster_solver_version = 5
+
+# SAMPLES PER CHUNK OF THE CHECKS AND REDUCTIONS OVER A WHOLE TRACE, NO FULL LENGTH TEMPORARY IS MADE
+trace_chunk_size = 65536
+
+# TIME AND Zth TRACE OF A POOL WORKER, ATTACHED ONCE PER PROCESS
+shared_trace = {}
+
+# POSITION OF OPTIONAL SETTINGS IN THE DEFAULT TUPLE
+foster_solver_index = 6
+warm_start_index = 7
+stop_ratio_index = 8
+criterion_index = 9
+workers_index = 10
+resample_index = 11
+cauer_engine_index = 12
+cache_directory_index = 13
+cache_size_index = 14
+spectrum_seed_index = 15
+multi_start_index = 16
+parameterization_index = 17
+chunk_size_index = 18
+float32_index = 19
+
+# SETTINGS WHICH DO NOT CHANGE THE RESULT AND ARE LEFT OUT OF THE CACHE KEY
+# (THE PARALLEL SWEEP ONLY RUNS COLD FITS WHEN WARM START IS OFF, SO ANY NUMBER OF WORKERS GIVES THE SERIAL RESULT)
+cache_ignored_indices = (4, 5, workers_index, cache_directory_index, cache_size_index)
+
+# FOSTER SOLVER MODES
+joint_solver = 'joint'
+separable_solver = 'separable'
+
+# OPTIMIZATION VARIABLES OF solve_foster, R AND C (linear) OR log(R) AND log(tau) (log)
+linear_parameterization = 'linear'
+log_parameterization = 'log'
+
+# INFORMATION CRITERIA FOR THE MODEL ORDER SWEEP
+aic_criterion = 'aic'
+bic_criterion = 'bic'
+
+# HOW THE ORDER SWEEP RUNS, RECORDED IN THE RUN REPORT
+serial_sweep = 'serial'
+parallel_orders_sweep = 'parallel orders'
+parallel_starts_sweep = 'parallel starts'
+spectrum_seed_sweep = 'spectrum seed'
+
 
 def check_null_value(trace, loc):
     """
@@ -53,48 +115,88 @@ def foster_default_value():
     # CREATE DIAGONOSTIC
     default_foster_diagnostic = False
     default_cauer_diagnostic = False
+    # SOLVER MODE joint (R and C together) or separable (tau nonlinear, R linear)
+    default_foster_solver = joint_solver
+    # SEED EACH ORDER FROM THE PREVIOUS ORDER
+    default_foster_warm_start = True
+    # STOP THE SWEEP WHEN RMS ERROR IMPROVES LESS THAN THIS RATIO (None runs all orders)
+    default_foster_stop_ratio = None
+    # SELECT THE ORDER BY aic OR bic INSTEAD OF LOWEST ERROR (None uses lowest error)
+    default_foster_criterion = None
+    # NUMBER OF PROCESSES FOR THE MODEL ORDER SWEEP
+    default_foster_workers = 1
+    # FIT ON THIS MANY LOG-SPACED POINTS PER DECADE OF TIME (None fits the raw trace)
+    default_foster_points_per_decade = None
+    # FOSTER TO CAUER CONVERSION numeric OR sympy
+    default_cauer_engine = 'numeric'
+    # RESULT CACHE DIRECTORY (None disables the cache) AND SIZE IN BYTES
+    default_cache_directory = path.join(path.expanduser('~'), '.cache', 'RC_1D_Network')
+    default_cache_size = 100 * 1024 * 1024
+    # FIT ONE ORDER SEEDED FROM THE PEAKS OF THE TIME CONSTANT SPECTRUM INSTEAD OF THE ORDER SWEEP
+    default_foster_spectrum_seed = False
+    # NUMBER OF STARTS PER ORDER WITH LOG-UNIFORM RANDOM TIME CONSTANTS, THE BEST FIT IS KEPT (1 IS A SINGLE START)
+    default_foster_multi_start = 1
+    # OPTIMIZATION VARIABLES linear (R AND C) OR log (log R AND log tau, BETTER SCALED OVER MANY DECADES)
+    default_foster_parameterization = linear_parameterization
+    # ROWS PER CHUNK OF THE MEMORY BOUNDED SOLVER (None SOLVES ON THE WHOLE TRACE AT ONCE)
+    default_foster_chunk_size = None
+    # KEEP Zth OF A READ FILE AS float32, SUMS ARE STILL ACCUMULATED IN float64
+    default_foster_float32 = False
     return (
         default_foster_lower_bound, default_foster_upper_bound, default_foster_ftol, default_foster_xtol,
-        default_foster_diagnostic, default_cauer_diagnostic)
+        default_foster_diagnostic, default_cauer_diagnostic, default_foster_solver, default_foster_warm_start,
+        default_foster_stop_ratio, default_foster_criterion, default_foster_workers,
+        default_foster_points_per_decade, default_cauer_engine, default_cache_directory, default_cache_size,
+        default_foster_spectrum_seed, default_foster_multi_start, default_foster_parameterization,
+        default_foster_chunk_size, default_foster_float32)
 
 
-def read_csv_file(file):
+def get_default_option(default_tuple, index, default):
+    """
+    Function to read an optional setting from the default tuple
+    :param default_tuple: Tuple from foster_default_value (may be shorter than the current layout)
+    :param index: Position of the setting
+    :param default: Value used when the setting is not present
+    :return: Setting value
+    """
+    try:
+        return default_tuple[index]
+    except (IndexError, TypeError):
+        return default
+
+
+def read_csv_file(file, sidecar=False):
     """
     Function to read a CSV file
     :param file: a CSV File
-    :return: List containing data
+    :param sidecar: Save a .npy copy next to the file and memory map it on later loads
+    :return: Array containing data
     """
+    output_list = trace_tools.load_trace(file, sidecar)
+    if len(output_list) < 2:
+        raise FC_Error_list.FosterCauer_Error("No Data in Input File")
+    try:
+        if check_null_value(output_list[0], 1):
+            return output_list
+    except IndexError:
+        raise FC_Error_list.FosterCauer_Error("Input file not organized correctly, Refer documentation")
 
-    if not path.exists(file):
-        raise FC_Error_list.FosterCauer_Error("File not found")
 
-    else:
-        try:
-            input_file = open(file, 'r')
-            lines = input_file.readlines()
-            if not len(lines) or len(lines) == 1:
-                raise FC_Error_list.FosterCauer_Error("No Data in Input File")
-            else:
-                output_list = []
-                for line in lines:
-                    split_line = line.split(",")
-                    output_line = []
-                    for line_item in split_line:
-                        line_item.rstrip("\n")
-                        try:
-                            if float(line_item):
-                                output_line.append(float(line_item))
-                            if float(line_item) == 0.0:
-                                output_line.append(0.0)
-                        except Exception:
-                            pass
-                    if len(output_line) > 0:
-                        output_list.append(output_line)
-
-            if check_null_value(output_list[0], 1):
-                return output_list
-        except IndexError:
-            raise FC_Error_list.FosterCauer_Error("Input file not organized correctly, Refer documentation")
+def read_csv_columns(file, float32=False):
+    """
+    Function to read the time and Zth columns of a CSV file
+    :param file: a CSV File
+    :param float32: Keep Zth as float32, the file is then read in chunks
+    :return: Time and Zth arrays
+    """
+    if not float32:
+        output_list = read_csv_file(file)
+        return output_list[:, 0], output_list[:, 1]
+    time, zth = trace_tools.load_trace_columns(file, 'float32')
+    if len(time) < 2:
+        raise FC_Error_list.FosterCauer_Error("No Data in Input File")
+    check_null_value(zth, 0)
+    return time, zth
 
 
 def sanity_check(time_trace, input_zth):
@@ -109,15 +211,14 @@ def sanity_check(time_trace, input_zth):
     if not len(time_trace) == len(input_zth):
         output = False
 
-    # CHECK IF THERE ARE NEGATIVE VALUES IN Zth
-    for i in input_zth:
-        if i < 0:
+    for part in chunk_slices(len(input_zth), trace_chunk_size):
+        # CHECK IF THERE ARE NEGATIVE VALUES IN Zth
+        if (asarray(input_zth[part]) < 0).any():
             raise FC_Error_list.FosterCauer_Error("Negative Zth in Input file")
 
-    # CHECK IF NEGATIVE TIME SLOP EXISTS
-    i = 0
-    for i in range(0, len(time_trace) - 1):
-        if time_trace[i + 1] < time_trace[i]:
+    for part in chunk_slices(len(time_trace), trace_chunk_size):
+        # CHECK IF NEGATIVE TIME SLOP EXISTS, THE CHUNKS OVERLAP BY ONE SAMPLE
+        if (diff(time_trace[max(part.start - 1, 0):part.stop]) < 0).any():
             raise FC_Error_list.FosterCauer_Error("Time trace is Negative")
 
     # CHECK IF Time TRACE AND Zth TRACE ARE GREATER THAN 3
@@ -127,6 +228,28 @@ def sanity_check(time_trace, input_zth):
     return output
 
 
+def split_foster_tuple(tpl):
+    """
+    Function to split a Foster tuple into R values and time constants
+    :param tpl: Contain the RC Pairs with R Value First and C Value Seconds
+    :return: Two arrays containing R values and time constants (R * C) in s
+    """
+    tpl = asarray(tpl, dtype=float)
+    r_values = tpl[0::2]
+    return r_values, r_values * tpl[1::2]
+
+
+def foster_basis(tau, x):
+    """
+    Function returning the Foster basis matrix 1 - exp(-t / tau)
+    :param tau: Time constants in s
+    :param x: Time
+    :return: Matrix with one row per time point and one column per time constant
+    """
+    x = asarray(x, dtype=float)
+    return 1 - exp(-x[..., None] / asarray(tau, dtype=float))
+
+
 def foster_func(tpl, x):
     """
     Function returning the Foster Function value
@@ -134,13 +257,8 @@ def foster_func(tpl, x):
     :param x: Time
     :return: Foster Function at Time t in s
     """
-    counter = 0
-    return_value = 0
-
-    while counter < len(tpl):
-        return_value += tpl[counter] * (1 - exp(-x / tpl[counter] / tpl[counter + 1]))
-        counter += 2
-    return return_value
+    r_values, tau_values = split_foster_tuple(tpl)
+    return foster_basis(tau_values, x) @ r_values
 
 
 def error_func(tpl, x, y):
@@ -155,6 +273,97 @@ def error_func(tpl, x, y):
     # *(foster_func(tpl, x) - y)
 
 
+def error_jac(tpl, x, y):
+    """
+    Function returning the analytic Jacobian of error_func
+    d/dR = 1 - exp(-t / tau) * (1 + t / tau)
+    d/dC = -exp(-t / tau) * t / C^2
+    :param tpl: Contain the RC Pairs with R Value First and C Value Seconds
+    :param x: Time point at which value is calculated.
+    :param y: Present Guessed value (unused, kept to match error_func)
+    :return: Jacobian with one row per time point and the columns ordered as tpl
+    """
+    tpl = asarray(tpl, dtype=float)
+    r_values, tau_values = split_foster_tuple(tpl)
+    x = asarray(x, dtype=float)
+    t_over_tau = x[:, None] / tau_values
+    decay = exp(-t_over_tau)
+    jacobian = empty((len(x), len(tpl)))
+    jacobian[:, 0::2] = 1 - decay * (1 + t_over_tau)
+    jacobian[:, 1::2] = -decay * x[:, None] / (tpl[1::2] * tpl[1::2])
+    return jacobian
+
+
+def log_parameters(tpl):
+    """
+    Function converting an RC tuple to the log parameterization
+    :param tpl: Contain the RC Pairs with R Value First and C Value Seconds
+    :return: Array with log(R) and log(tau) in the layout of tpl
+    """
+    r_values, tau_values = split_foster_tuple(tpl)
+    return column_stack((np_log(r_values), np_log(tau_values))).ravel()
+
+
+def linear_parameters(log_tpl):
+    """
+    Function converting the log parameterization back to an RC tuple
+    :param log_tpl: Array with log(R) and log(tau) in the layout of the RC tuple
+    :return: RC tuple with R Value First and C Value Seconds
+    """
+    log_tpl = asarray(log_tpl, dtype=float)
+    r_values = exp(log_tpl[0::2])
+    return column_stack((r_values, exp(log_tpl[1::2]) / r_values)).ravel()
+
+
+def log_parameter_bounds(lower_bound, upper_bound, count_elements):
+    """
+    Function mapping the R and C bounds to the log parameterization, tau = R C is bounded by [lower^2, upper^2]
+    :param lower_bound: Lower bound of R and C
+    :param upper_bound: Upper bound of R and C
+    :param count_elements: Number of RC pairs
+    :return: Lower and upper bound arrays in the layout of log_parameters
+    """
+    with errstate(divide='ignore'):
+        log_lower_bound = np_log(lower_bound)
+        log_upper_bound = np_log(upper_bound)
+    bounds = (full(2 * count_elements, log_lower_bound), full(2 * count_elements, log_upper_bound))
+    bounds[0][1::2] *= 2
+    bounds[1][1::2] *= 2
+    return bounds
+
+
+def log_error_func(log_tpl, x, y):
+    """
+    Function returning error_func of a network given by log(R) and log(tau)
+    :param log_tpl: Array with log(R) and log(tau) in the layout of the RC tuple
+    :param x: Time point at which value is calculated.
+    :param y: Present Guessed value
+    :return: Error Function
+    """
+    return error_func(linear_parameters(log_tpl), x, y)
+
+
+def log_error_jac(log_tpl, x, y):
+    """
+    Function returning the analytic Jacobian of log_error_func
+    d/dlog(R) = R (1 - exp(-t / tau))
+    d/dlog(tau) = -R exp(-t / tau) t / tau
+    :param log_tpl: Array with log(R) and log(tau) in the layout of the RC tuple
+    :param x: Time point at which value is calculated.
+    :param y: Present Guessed value (unused, kept to match log_error_func)
+    :return: Jacobian with one row per time point and the columns ordered as log_tpl
+    """
+    log_tpl = asarray(log_tpl, dtype=float)
+    r_values = exp(log_tpl[0::2])
+    x = asarray(x, dtype=float)
+    t_over_tau = x[:, None] * exp(-log_tpl[1::2])
+    decay = exp(-t_over_tau)
+    jacobian = empty((len(x), len(log_tpl)))
+    jacobian[:, 0::2] = r_values * (1 - decay)
+    jacobian[:, 1::2] = -r_values * decay * t_over_tau
+    return jacobian
+
+
 def sort_tpl(rc_list):
     """
     Function to Split RC Tuple to Individual lists.
@@ -171,15 +380,430 @@ def sort_tpl(rc_list):
     return r_list, c_list
 
 
-def solve_foster(time, input_zth, count_elements, default_tuple=None):
+def positive_time_range(time):
+    """
+    Function returning the smallest and largest positive time, chunk by chunk
+    :param time: time in seconds, in any order
+    :return: Tuple (smallest, largest)
+    """
+    smallest, largest = inf, -inf
+    for part in chunk_slices(len(time), trace_chunk_size):
+        chunk = asarray(time[part], dtype=float)
+        positive_time = chunk[chunk > 0]
+        if len(positive_time):
+            smallest = min(smallest, float(positive_time.min()))
+            largest = max(largest, float(positive_time.max()))
+    if smallest == inf:
+        raise FC_Error_list.FosterCauer_Error("Time trace has no positive values")
+    return smallest, largest
+
+
+def log_spaced_tau(time, count_elements):
+    """
+    Function returning time constants spread evenly on a log scale over the time trace
+    :param time: time in seconds
+    :param count_elements: Number of time constants
+    :return: Array of time constants in s
+    """
+    smallest, largest = positive_time_range(time)
+    start = log10(smallest)
+    stop = log10(largest)
+    if stop <= start:
+        stop = start + 1
+    return logspace(start, stop, 2 * count_elements + 1)[1::2]
+
+
+def monitored_residual(residual, callback, element_count):
+    """
+    Function wrapping a residual function so every evaluation is reported to a callback
+    :param residual: Residual function of least_squares
+    :param callback: Called with a dictionary (stage iteration, order, nfev, cost), may raise
+                     FosterCauer_Cancelled to stop the solve
+    :param element_count: Number of RC pairs being solved
+    :return: Wrapped residual function
+    """
+    state = {'nfev': 0}
+
+    def wrapped(x, *args):
+        value = residual(x, *args)
+        state['nfev'] += 1
+        callback({'stage': 'iteration', 'order': element_count, 'nfev': state['nfev'],
+                  'cost': 0.5 * float(value @ value)})
+        return value
+
+    return wrapped
+
+
+def variable_projection(basis_func, derivative_func, target, initial_tau, count_elements, lower_bound, upper_bound,
+                        ftol, xtol, callback=None, parameterization=linear_parameterization):
+    """
+    Curve Fitting of time constants by variable projection, the coefficients (R values) of the basis are solved
+    linearly at every step and only the time constants go through the nonlinear solver
+    :param basis_func: Function of tau returning the real basis matrix, one column per time constant
+    :param derivative_func: Function of (tau, R values, basis) returning d(basis @ R) / d tau, one column per tau
+    :param target: Real values to match
+    :param initial_tau: Time constants to start from
+    :param count_elements: Number of RC pairs, reported to the callback
+    :param lower_bound: Lower bound of R, the time constants are bounded by its square
+    :param upper_bound: Upper bound of R, the time constants are bounded by its square
+    :param ftol: Tolerance of the cost function
+    :param xtol: Tolerance of the time constants
+    :param callback: Called after every residual evaluation (see monitored_residual)
+    :param parameterization: linear solves for tau, log for log(tau)
+    :return: Time constants, R values and the least_squares result
+    """
+    tau_lower_bound = lower_bound * lower_bound
+    tau_upper_bound = upper_bound * upper_bound
+    initial_tau = clip(initial_tau, tau_lower_bound, tau_upper_bound)
+    # LAST LINEAR SOLUTION, REUSED BY THE JACOBIAN AT THE SAME TIME CONSTANTS
+    state = {}
+
+    def projected(tau):
+        if state.get('tau') is None or not (state['tau'] == tau).all():
+            state['tau'] = tau.copy()
+            state['basis'] = basis_func(tau)
+            state['r'] = lsq_linear(state['basis'], target, bounds=(lower_bound, upper_bound), method='bvls').x
+        return state['basis'], state['r']
+
+    def residual(tau):
+        basis, r_values = projected(tau)
+        return basis @ r_values - target
+
+    def jacobian(tau):
+        # KAUFMAN APPROXIMATION OF THE VARIABLE PROJECTION JACOBIAN
+        basis, r_values = projected(tau)
+        derivative = derivative_func(tau, r_values, basis)
+        free = flatnonzero((r_values > lower_bound) & (r_values < upper_bound))
+        if len(free):
+            free_basis = basis[:, free]
+            derivative = derivative - free_basis @ lstsq(free_basis, derivative, rcond=None)[0]
+        return derivative
+
+    variables = initial_tau
+    bounds = (tau_lower_bound, tau_upper_bound)
+    if parameterization == log_parameterization:
+        tau_residual = residual
+        tau_jacobian = jacobian
+
+        def residual(log_tau):
+            return tau_residual(exp(log_tau))
+
+        def jacobian(log_tau):
+            tau = exp(log_tau)
+            return tau_jacobian(tau) * tau
+
+        with errstate(divide='ignore'):
+            variables = np_log(initial_tau)
+            bounds = (np_log(tau_lower_bound), np_log(tau_upper_bound))
+    elif parameterization != linear_parameterization:
+        raise FC_Error_list.FosterCauer_Error("Unknown parameterization " + str(parameterization))
+
+    if callback is not None:
+        residual = monitored_residual(residual, callback, count_elements)
+
+    output = least_squares(residual, x0=variables, jac=jacobian, bounds=bounds,
+                           method='trf', ftol=ftol, xtol=xtol, gtol=1e-08, x_scale=1.0, loss='linear')
+
+    tau = exp(output.x) if parameterization == log_parameterization else output.x
+    return tau, projected(tau)[1], output
+
+
+def solve_foster_separable(time, input_zth, count_elements, lower_bound, upper_bound, ftol, xtol,
+                           initial_guess=None, callback=None, parameterization=linear_parameterization):
+    """
+    Curve Fitting RC Values by variable projection (see variable_projection).
+    Only the time constants go through the nonlinear solver, R values are solved linearly at every step.
+    :param time: time in seconds
+    :param input_zth: Zth to match values
+    :param count_elements: Number of RC pairs.
+    :param initial_guess: RC tuple to start from, time constants are log-spaced over the trace if None
+    :param callback: Called after every residual evaluation (see monitored_residual)
+    :param parameterization: linear solves for tau, log for log(tau)
+    :return: Tuple containing R and C values in the solve_foster layout and the least_squares result
+    """
+    time = asarray(time, dtype=float)
+    input_zth = asarray(input_zth, dtype=float)
+    if initial_guess is None:
+        initial_tau = log_spaced_tau(time, count_elements)
+    else:
+        initial_tau = split_foster_tuple(initial_guess)[1]
+
+    def derivative(tau, r_values, basis):
+        return -(1 - basis) * (r_values * time[:, None] / (tau * tau))
+
+    tau, r_values, output = variable_projection(lambda tau: foster_basis(tau, time), derivative, input_zth,
+                                                initial_tau, count_elements, lower_bound, upper_bound, ftol, xtol,
+                                                callback, parameterization)
+    tpl_final = column_stack((r_values, tau / r_values)).ravel()
+    return tpl_final, output
+
+
+def chunk_slices(length, chunk_size):
+    """
+    Function returning the slices of a trace split in chunks
+    :param length: Number of samples
+    :param chunk_size: Samples per chunk
+    :return: Generator of slices
+    """
+    for start in range(0, length, chunk_size):
+        yield slice(start, min(start + chunk_size, length))
+
+
+def chunked_sum_square(parameters, residual, time, input_zth, chunk_size):
+    """
+    Function returning the sum of squared residuals computed chunk by chunk in float64
+    :param parameters: Optimization variables
+    :param residual: Residual function (parameters, time, zth) such as error_func
+    :param time: time in seconds
+    :param input_zth: zth, float32 or float64
+    :param chunk_size: Samples per chunk
+    :return: Sum of squared residuals
+    """
+    sum_square = 0.0
+    for part in chunk_slices(len(time), chunk_size):
+        error = residual(parameters, asarray(time[part], dtype=float64), asarray(input_zth[part], dtype=float64))
+        sum_square += float(error @ error)
+    return sum_square
+
+
+def chunked_normal_equations(parameters, residual, jacobian, time, input_zth, chunk_size):
+    """
+    Function accumulating the normal equations J^T J and J^T r chunk by chunk in float64, only one chunk of the
+    Jacobian is held in memory
+    :param parameters: Optimization variables
+    :param residual: Residual function (parameters, time, zth) such as error_func
+    :param jacobian: Jacobian function of residual such as error_jac
+    :param time: time in seconds
+    :param input_zth: zth, float32 or float64
+    :param chunk_size: Samples per chunk
+    :return: J^T J, J^T r and the sum of squared residuals
+    """
+    normal_matrix = zeros((len(parameters), len(parameters)))
+    gradient = zeros(len(parameters))
+    sum_square = 0.0
+    for part in chunk_slices(len(time), chunk_size):
+        chunk_time = asarray(time[part], dtype=float64)
+        chunk_zth = asarray(input_zth[part], dtype=float64)
+        error = residual(parameters, chunk_time, chunk_zth)
+        chunk_jacobian = jacobian(parameters, chunk_time, chunk_zth)
+        normal_matrix += chunk_jacobian.T @ chunk_jacobian
+        gradient += chunk_jacobian.T @ error
+        sum_square += float(error @ error)
+    return normal_matrix, gradient, sum_square
+
+
+def symmetric_solve(matrix, vector):
+    """
+    Function solving a positive semi-definite system by eigen decomposition, eigenvalues below its round off are
+    dropped so a nearly singular matrix does not blow up the solution
+    :param matrix: Symmetric matrix
+    :param vector: Right hand side
+    :return: Minimum norm solution
+    """
+    eigenvalues, eigenvectors = eigh(matrix)
+    kept = eigenvalues > finfo(float).eps * len(eigenvalues) * max(eigenvalues.max(), 0)
+    return eigenvectors[:, kept] @ ((eigenvectors[:, kept].T @ vector) / eigenvalues[kept])
+
+
+def trust_region_step(normal_matrix, gradient, radius):
+    """
+    Function returning the step minimizing the Gauss-Newton model g.s + s.J^T J.s / 2 with |s| <= radius.
+    The damped system J^T J + damping I is solved scaled to a unit diagonal, the Levenberg-Marquardt damping of the
+    radius is found by bisection on a log scale.
+    :param normal_matrix: J^T J of the free variables
+    :param gradient: J^T r of the free variables
+    :param radius: Trust region radius
+    :return: Step of the free variables
+    """
+    def damped_step(damping):
+        matrix = normal_matrix + damping * eye(len(gradient))
+        scale = sqrt_array(diag(matrix))
+        scale[scale <= 0] = 1.0
+        return -symmetric_solve(matrix / outer(scale, scale), gradient / scale) / scale
+
+    # A COLUMN OF J NEAR ZERO (A DEAD RC PAIR) CAN OVERFLOW THE UNDAMPED STEP, IT IS THEN DAMPED BELOW
+    with errstate(over='ignore', divide='ignore', invalid='ignore'):
+        step = damped_step(0.0)
+        if isfinite(step).all() and norm(step) <= radius:
+            return step
+
+    # |s| DECREASES WITH THE DAMPING, BRACKET THE RADIUS AND BISECT TO WITHIN 10 %
+    low, high = 0.0, max(norm(gradient) / radius, 1e-300)
+    while norm(damped_step(high)) > radius:
+        low, high = high, 4 * high
+    for _ in range(100):
+        damping = sqrt(low * high) if low > 0 else high / 1e6
+        step = damped_step(damping)
+        step_norm = norm(step)
+        if 0.9 * radius <= step_norm <= radius:
+            return step
+        if step_norm > radius:
+            low = damping
+        else:
+            high = damping
+    return damped_step(high)
+
+
+def interior_step(parameters, step, lower, upper, theta=0.995):
+    """
+    Function limiting every component of a step to theta of its distance to the bound it crosses, so the parameters
+    stay inside the bounds. A variable clipped onto a bound would be stuck there (a C value at the lower bound with
+    its gradient pointing out of the bounds) and shortening the whole step would stop the other variables as well.
+    :param parameters: Parameters inside or on the bounds
+    :param step: Step
+    :param lower: Lower bound per parameter
+    :param upper: Upper bound per parameter
+    :param theta: Share of the distance to the bound a component may move
+    :return: Limited step
+    """
+    return clip(step, theta * (lower - parameters), theta * (upper - parameters))
+
+
+def solve_normal_equations(parameters, lower, upper, residual, jacobian, time, input_zth, chunk_size, ftol, xtol,
+                           gtol=1e-08, max_nfev=None, callback=None, count_elements=None):
+    """
+    Bounded trust region solver on normal equations accumulated chunk by chunk (see chunked_normal_equations).
+    Every evaluation is one pass over the trace and only arrays of the chunk size and the variables x variables
+    system are held, so memory does not grow with the trace length. The trust region and its updates follow the trf
+    method of least_squares with x_scale 1, variables on a bound with the gradient pointing out of the bounds are
+    kept fixed for the step and the step stops short of the bounds (see interior_step).
+    :param parameters: Start parameters
+    :param lower: Lower bound per parameter
+    :param upper: Upper bound per parameter
+    :param residual: Residual function of (parameters, time, zth), error_func or log_error_func
+    :param jacobian: Jacobian function of (parameters, time, zth), error_jac or log_error_jac
+    :param time: time in seconds
+    :param input_zth: Zth to match values, float32 or float64
+    :param chunk_size: Samples per chunk
+    :param ftol: Relative reduction of the sum of squares to stop at
+    :param xtol: Relative step size to stop at
+    :param gtol: Largest gradient of the free variables to stop at
+    :param max_nfev: Maximum number of evaluations, 100 per variable if None
+    :param callback: Called after every evaluation (see monitored_residual)
+    :param count_elements: Number of RC pairs reported to the callback
+    :return: OptimizeResult in the least_squares layout
+    """
+    parameters = clip(asarray(parameters, dtype=float), lower, upper)
+    max_nfev = max_nfev or 100 * len(parameters)
+    normal_matrix, gradient, sum_square = chunked_normal_equations(parameters, residual, jacobian, time, input_zth,
+                                                                   chunk_size)
+    nfev = njev = 1
+    radius = norm(parameters) or 1.0
+    status, message = 0, "The maximum number of function evaluations is exceeded."
+    while nfev < max_nfev and status == 0:
+        free = ~(((parameters <= lower) & (gradient > 0)) | ((parameters >= upper) & (gradient < 0)))
+        if not free.any() or abs(gradient[free]).max() <= gtol:
+            status, message = 1, "`gtol` termination condition is satisfied."
+            break
+
+        reduction = -1.0
+        while reduction <= 0 and nfev < max_nfev:
+            step = zeros(len(parameters))
+            step[free] = trust_region_step(normal_matrix[ix_(free, free)], gradient[free], radius)
+            step = interior_step(parameters, step, lower, upper)
+            candidate = clip(parameters + step, lower, upper)
+            step_norm = norm(step)
+
+            candidate_equations = chunked_normal_equations(candidate, residual, jacobian, time, input_zth,
+                                                           chunk_size)
+            nfev += 1
+            njev += 1
+            if callback is not None:
+                callback({'stage': 'iteration', 'order': count_elements, 'nfev': nfev,
+                          'cost': 0.5 * candidate_equations[2]})
+
+            # REDUCTION OF THE SUM OF SQUARES PREDICTED BY THE LINEAR MODEL AND OBTAINED
+            predicted = -(2 * (gradient @ step) + step @ normal_matrix @ step)
+            reduction = sum_square - candidate_equations[2]
+            ratio = reduction / predicted if predicted > 0 else 0.0
+            if ratio < 0.25:
+                radius = 0.25 * step_norm
+            elif ratio > 0.75 and step_norm > 0.95 * radius:
+                radius *= 2.0
+
+            # TERMINATION TESTS OF THE trf METHOD
+            if reduction < ftol * sum_square and ratio > 0.25:
+                status, message = 2, "`ftol` termination condition is satisfied."
+            elif step_norm < xtol * (xtol + norm(parameters)):
+                status, message = 3, "`xtol` termination condition is satisfied."
+            if status:
+                break
+
+        if reduction > 0:
+            parameters = candidate
+            normal_matrix, gradient, sum_square = candidate_equations
+
+    return OptimizeResult(x=parameters, cost=0.5 * sum_square, grad=gradient, optimality=float(abs(gradient).max()),
+                          nfev=nfev, njev=njev, status=status, message=message, success=status > 0)
+
+
+def solve_foster_chunked(time, input_zth, count_elements, lower_bound, upper_bound, ftol, xtol, chunk_size,
+                         initial_guess=None, callback=None, parameterization=linear_parameterization):
+    """
+    Curve Fitting RC Values with a bounded Levenberg-Marquardt solver on chunked normal equations
+    (see solve_normal_equations), memory does not grow with the trace length.
+    :param time: time in seconds
+    :param input_zth: Zth to match values, float32 or float64
+    :param count_elements: Number of RC pairs.
+    :param chunk_size: Samples per chunk
+    :param initial_guess: RC tuple to start from (warm start), default guess of solve_foster if None
+    :param callback: Called after every evaluation (see monitored_residual)
+    :param parameterization: linear solves for R and C, log for log(R) and log(tau)
+    :return: Tuple containing R and C values in the solve_foster layout and an OptimizeResult
+    """
+    if parameterization == log_parameterization:
+        if initial_guess is None:
+            initial_guess = multi_start_guesses(time, input_zth, count_elements, 1)[0]
+        lower, upper = log_parameter_bounds(lower_bound, upper_bound, count_elements)
+        parameters = log_parameters(initial_guess)
+        residual, jacobian = log_error_func, log_error_jac
+    elif parameterization == linear_parameterization:
+        if initial_guess is None:
+            initial_guess = (0.1, 0.1) * count_elements
+        lower, upper = full(2 * count_elements, lower_bound), full(2 * count_elements, upper_bound)
+        parameters = asarray(initial_guess, dtype=float)
+        residual, jacobian = error_func, error_jac
+    else:
+        raise FC_Error_list.FosterCauer_Error("Unknown parameterization " + str(parameterization))
+
+    output = solve_normal_equations(parameters, lower, upper, residual, jacobian, time, input_zth, chunk_size, ftol,
+                                    xtol, callback=callback, count_elements=count_elements)
+    if parameterization == log_parameterization:
+        return linear_parameters(output.x), output
+    return output.x, output
+
+
+def chunked_table_row(element_count, rc_network_list, time, input_zth, chunk_size):
+    """
+    Function to build one row of the error versus order table chunk by chunk (see network_table_row).
+    The error trace is not kept, write_diagnostic recomputes it when a diagnostic file is written.
+    :param element_count: Number of RC pairs
+    :param rc_network_list: Solved RC tuple
+    :param time: time in seconds
+    :param input_zth: zth, float32 or float64
+    :param chunk_size: Samples per chunk
+    :return: Tuple (element count, network, error, None, RMS error, AIC, BIC)
+    """
+    return order_table_row(element_count, rc_network_list,
+                           chunked_sum_square(rc_network_list, error_func, time, input_zth, chunk_size), len(time))
+
+
+def solve_foster(time, input_zth, count_elements, default_tuple=None, initial_guess=None, callback=None):
     """
     Curve Fitting RC Values
     :param time: time in seconds
     :param input_zth: Zth to match values
     :param count_elements: Maximum number of elements to use.
+    :param default_tuple: Tuple from foster_default_value, the solver mode and parameterization are read from it.
+                          With a chunk size only the joint solver is supported.
+                          The log parameterization solves for log(R) in [log(lower), log(upper)] and log(tau) in
+                          [2 log(lower), 2 log(upper)], C is not bounded separately.
+    :param initial_guess: RC tuple to start from (warm start), default guess is used if None, the log
+                          parameterization starts from log-spaced time constants (see multi_start_guesses)
+    :param callback: Called after every residual evaluation (see monitored_residual) and once with the
+                     least_squares summary (see instrumentation.solve_record)
     :return: tuple containing R and C List.
     """
-    initial_guess = (0.1, 0.1) * count_elements
     try:
         foster_lower_bound = default_tuple[0]
         foster_upper_bound = default_tuple[1]
@@ -190,8 +814,59 @@ def solve_foster(time, input_zth, count_elements, default_tuple=None):
         foster_upper_bound = inf
         foster_ftol = 1e-08
         foster_xtol = 1e-08
+    foster_solver = get_default_option(default_tuple, foster_solver_index, joint_solver)
+    parameterization = get_default_option(default_tuple, parameterization_index, linear_parameterization)
+    chunk_size = get_default_option(default_tuple, chunk_size_index, None)
+
+    start = perf_counter()
+    if chunk_size:
+        # THE CHUNKED SOLVER IS A JOINT SOLVER
+        if foster_solver != joint_solver:
+            raise FC_Error_list.FosterCauer_Error("Chunk size needs the joint solver, " + str(foster_solver) +
+                                                  " solver is not supported")
+        tpl_final, output = solve_foster_chunked(time, input_zth, count_elements, foster_lower_bound,
+                                                 foster_upper_bound, foster_ftol, foster_xtol, chunk_size,
+                                                 initial_guess, callback, parameterization)
+        if callback is not None:
+            callback(instrumentation.solve_record(output, count_elements, 'chunked', perf_counter() - start))
+        return tpl_final
+    if foster_solver == separable_solver:
+        tpl_final, output = solve_foster_separable(time, input_zth, count_elements, foster_lower_bound,
+                                                   foster_upper_bound, foster_ftol, foster_xtol, initial_guess,
+                                                   callback, parameterization)
+        if callback is not None:
+            callback(instrumentation.solve_record(output, count_elements, foster_solver, perf_counter() - start))
+        return tpl_final
+    elif foster_solver != joint_solver:
+        raise FC_Error_list.FosterCauer_Error("Unknown Foster solver " + str(foster_solver))
+
+    if parameterization == log_parameterization:
+        if initial_guess is None:
+            initial_guess = multi_start_guesses(time, input_zth, count_elements, 1)[0]
+        log_bounds = log_parameter_bounds(foster_lower_bound, foster_upper_bound, count_elements)
+        residual = log_error_func
+        if callback is not None:
+            residual = monitored_residual(log_error_func, callback, count_elements)
+        output = least_squares(residual, x0=clip(log_parameters(initial_guess), log_bounds[0], log_bounds[1]),
+                               jac=log_error_jac, bounds=log_bounds, method='trf', ftol=foster_ftol,
+                               xtol=foster_xtol, gtol=1e-08, x_scale=1.0, loss='linear', args=(time, input_zth))
+        tpl_final = linear_parameters(output.x)
+        if callback is not None:
+            callback(instrumentation.solve_record(output, count_elements, foster_solver, perf_counter() - start))
+        return tpl_final
+    elif parameterization != linear_parameterization:
+        raise FC_Error_list.FosterCauer_Error("Unknown parameterization " + str(parameterization))
+
+    if initial_guess is None:
+        initial_guess = (0.1, 0.1) * count_elements
+    else:
+        initial_guess = clip(asarray(initial_guess, dtype=float), foster_lower_bound, foster_upper_bound)
+
+    residual = error_func
+    if callback is not None:
+        residual = monitored_residual(error_func, callback, count_elements)
 
-    output = least_squares(error_func, x0=initial_guess, jac='2-point', bounds=(foster_lower_bound, foster_upper_bound),
+    output = least_squares(residual, x0=initial_guess, jac=error_jac, bounds=(foster_lower_bound, foster_upper_bound),
                            method='trf',
                            ftol=foster_ftol,
                            xtol=foster_xtol, gtol=1e-08, x_scale=1.0, loss='linear', f_scale=1.0, diff_step=None,
@@ -204,138 +879,576 @@ def solve_foster(time, input_zth, count_elements, default_tuple=None):
     #                        tr_options={}, jac_sparsity=None, max_nfev=None, verbose=0, args=(time, input_zth))
 
     tpl_final = output.x
+    if callback is not None:
+        callback(instrumentation.solve_record(output, count_elements, foster_solver, perf_counter() - start))
     # sort_tpl(tpl_final)
     # print(tpl_final)
     return tpl_final
 
 
-def delete_diagnostic_file():
+def unique_diagnostic_filename(extension='.xlsx'):
     """
-    Delete the diagnostic File writter earlier.
-    :return: None
+    Function returning a diagnostic file name unique to this run
+    :param extension: .xlsx or .npz
+    :return: File name in the working directory
     """
-    if exists(diagnostic_filename):
-        remove(diagnostic_filename)
+    stem = path.splitext(diagnostic_filename)[0]
+    return stem + '_' + strftime('%Y%m%d_%H%M%S') + '_' + str(getpid()) + '_' + uuid4().hex[:8] + extension
 
 
-def create_diagnostic_header(time_trace, input_z):
+def write_diagnostic(network_combination, time_trace, input_z, filename=None):
     """
-    Create a Diagnostic header
+    Write the Diagnostic file of a whole model order sweep in one go
+    :param network_combination: Error versus order table of create_foster_network
     :param time_trace: time in seconds
     :param input_z: input Impedance
-    :return: False if Diagnostic file exists True if new file is created.
+    :param filename: .xlsx or .npz file, a unique file name is used if None
+    :return: Diagnostic file name
+    """
+    filename = filename or unique_diagnostic_filename()
+    time_trace = asarray(time_trace, dtype=float)
+    input_z = asarray(input_z, dtype=float)
+    element_counts = [item[0] for item in network_combination]
+    errors = [float(item[2]) for item in network_combination]
+    error_traces = column_stack([asarray(item[3], dtype=float) if item[3] is not None else
+                                 error_func(item[1], time_trace, input_z) for item in network_combination])
+    z_curves = column_stack([foster_func(item[1], time_trace) for item in network_combination])
+
+    if filename.endswith('.npz'):
+        networks = full((len(network_combination), 2 * max(element_counts)), nan)
+        for row, item in enumerate(network_combination):
+            networks[row, :len(item[1])] = item[1]
+        savez_compressed(filename, time=time_trace, input_zth=input_z, element_counts=asarray(element_counts),
+                         networks=networks, errors=asarray(errors), error_traces=error_traces, zth_curves=z_curves)
+        return filename
+
+    wb = Workbook(write_only=True)
+    sheet = wb.create_sheet(title="Network_Combinations")
+    sheet.append(["Number of Elements"] + element_counts)
+    sheet.append(["RC Network"] + [str(item[1]) for item in network_combination])
+    sheet.append(["Error"] + errors)
+    for row, error_row in enumerate(error_traces.tolist()):
+        sheet.append(["Error Trace" if row == 0 else None] + error_row)
+
+    sheet_zth = wb.create_sheet(title="Zth")
+    sheet_zth.append(["Time", "Input Zth"] + [str(i * 2) + " Elements" for i in element_counts])
+    for zth_row in column_stack((time_trace, input_z, z_curves)).tolist():
+        sheet_zth.append(zth_row)
+
+    wb.save(filename)
+    wb.close()
+    return filename
+
+
+def insert_time_constant(tpl, time):
+    """
+    Function to seed the next network order from a solved network.
+    One RC pair is inserted in the widest gap between the existing time constants on a log scale.
+    :param tpl: Solved RC tuple
+    :param time: time in seconds
+    :return: RC tuple with one more RC pair
+    """
+    r_values, tau_values = split_foster_tuple(tpl)
+    smallest, largest = positive_time_range(time)
+    log_tau = sorted([log10(smallest), log10(largest)] + [log10(i) for i in tau_values])
+    gap = 0
+    for i in range(1, len(log_tau)):
+        if log_tau[i] - log_tau[i - 1] > log_tau[gap + 1] - log_tau[gap]:
+            gap = i - 1
+    tau_new = 10 ** ((log_tau[gap] + log_tau[gap + 1]) / 2)
+    r_new = 0.01 * r_values.mean()
+    return list(tpl) + [r_new, tau_new / r_new]
+
+
+def order_table_row(element_count, rc_network_list, sum_square, sample_count, error=None):
+    """
+    Function to build one row of the error versus order table from the sum of squared errors
+    :param element_count: Number of RC pairs
+    :param rc_network_list: Solved RC tuple
+    :param sum_square: Sum of squared errors
+    :param sample_count: Number of errors in the sum
+    :param error: Error trace, None if it is not kept
+    :return: Tuple (element count, network, error, error trace, RMS error, AIC, BIC)
+    """
+    sum_error_square = sqrt(sum_square)
+    parameter_count = 2 * element_count
+    # GUARD AGAINST log(0) FOR EXACT FITS
+    log_likelihood = sample_count * log(max(sum_square / sample_count, 1e-300))
+    aic = log_likelihood + 2 * parameter_count
+    bic = log_likelihood + parameter_count * log(sample_count)
+    rms_error = sum_error_square / sqrt(sample_count)
+    return element_count, rc_network_list, sum_error_square, error, rms_error, aic, bic
+
+
+def network_table_row(element_count, rc_network_list, time, input_zth):
+    """
+    Function to build one row of the error versus order table
+    :param element_count: Number of RC pairs
+    :param rc_network_list: Solved RC tuple
+    :param time: time in seconds
+    :param input_zth: zth
+    :return: Tuple (element count, network, error, error trace, RMS error, AIC, BIC)
+    """
+    error = error_func(rc_network_list, time, input_zth)
+    return order_table_row(element_count, rc_network_list, sum(map(lambda i: i * i, error)), len(error), error)
+
+
+def sweep_should_stop(network_combination, stop_ratio, criterion):
     """
-    if exists(diagnostic_filename):
+    Function to decide if the model order sweep can stop after the last row
+    :param network_combination: Error versus order table so far
+    :param stop_ratio: Minimum relative RMS improvement to continue (None to disable)
+    :param criterion: aic or bic, stop once the criterion got worse (None to disable)
+    :return: True if no further order is needed
+    """
+    if len(network_combination) < 2:
         return False
-    else:
-        wb = Workbook()
-        sheet = wb['Sheet']
-        sheet.title = "Network_Combinations"
-        sheet.cell(row=1, column=1, value="Number of Elements")
-        sheet.cell(row=2, column=1, value="RC Network")
-        sheet.cell(row=3, column=1, value="Error")
-        sheet.cell(row=4, column=1, value="Error Trace")
-
-        sheet_zth = wb.create_sheet(title="Zth")
-        sheet_zth.cell(row=1, column=1, value="Time")
-        sheet_zth.cell(row=1, column=2, value="Input Zth")
-        r = 2
-        for i in time_trace:
-            sheet_zth.cell(row=r, column=1, value=i)
-            r += 1
-        r = 2
-        for i in input_z:
-            sheet_zth.cell(row=r, column=2, value=i)
-            r += 1
-
-        wb.save(diagnostic_filename)
-        wb.close()
+    previous = network_combination[-2]
+    last = network_combination[-1]
+    if stop_ratio is not None and last[4] > (1 - stop_ratio) * previous[4]:
         return True
+    if criterion is not None:
+        column = criterion_column(criterion)
+        if last[column] > min(item[column] for item in network_combination[:-1]):
+            return True
+    return False
 
 
-def write_diagnostic(item, time_trace, input_z):
+def criterion_column(criterion):
     """
-    Write Diagnostic file
-    :param item:
-    :param time_trace:
-    :param input_z:
-    :return:
+    Function returning the table column of an information criterion
+    :param criterion: aic or bic
+    :return: Column index in the error versus order table
+    """
+    if criterion == aic_criterion:
+        return 5
+    elif criterion == bic_criterion:
+        return 6
+    raise FC_Error_list.FosterCauer_Error("Unknown information criterion " + str(criterion))
+
+
+def select_foster_network(network_combination, criterion=None):
+    """
+    Function to select the best network of the error versus order table
+    :param network_combination: Error versus order table
+    :param criterion: aic or bic, lowest error is used if None
+    :return: Selected table row
+    """
+    column = 2 if criterion is None else criterion_column(criterion)
+    minimal = inf
+    minimal_location = -1
+    for item in network_combination:
+        if minimal > item[column]:
+            minimal = item[column]
+            minimal_location = network_combination.index(item)
+    return network_combination[minimal_location]
+
+
+def sweep_orders(solve_order, table_row, first_order, maximum_elements, warm_start, stop_ratio, criterion,
+                 guess_time, callback=None, initial_guess=None):
     """
-    if create_diagnostic_header(time_trace, input_z):
-        workbook = load_workbook(diagnostic_filename)
-        worksheet = workbook["Network_Combinations"]
-        col = item[0] + 1
-        worksheet.cell(row=1, column=col, value=item[0])
-        worksheet.cell(row=2, column=col, value=str(item[1]))
-        worksheet.cell(row=3, column=col, value=item[2])
-        r = 4
-        for i in item[3]:
-            worksheet.cell(row=r, column=col, value=i)
-            r += 1
-
-        r = 2
-        zth_worksheet = workbook["Zth"]
-        col = item[0] + 2
-        zth_worksheet.cell(row=1, column=col, value=str(item[0] * 2) + " Elements")
-        z_curve = foster_func(item[1], time_trace)
-        for i in z_curve:
-            zth_worksheet.cell(row=r, column=col, value=i)
-            r += 1
-        workbook.save(diagnostic_filename)
-        workbook.close()
-
-
-def create_foster_network(time, input_zth, default_tuple, max_elements=None):
+    Function running the model order sweep, shared by the time and frequency domain fits
+    :param solve_order: Function of (order, initial guess) returning the solved RC tuple
+    :param table_row: Function of (order, RC tuple) returning the error versus order table row
+    :param first_order: First number of RC pairs
+    :param maximum_elements: Sweep stops before this order
+    :param warm_start: Seed each order from the previous one (see insert_time_constant)
+    :param stop_ratio: Minimum relative RMS improvement to continue (see sweep_should_stop)
+    :param criterion: aic or bic to stop once it got worse, None to disable
+    :param guess_time: Time span the inserted time constant of a warm start is placed in
+    :param callback: Called after every order with a dictionary (stage order, order, error, rms_error, aic, bic,
+                     best_error)
+    :param initial_guess: RC tuple the first order starts from, default guess if None
+    :return: Error versus order table
+    """
+    network_combination = []
+    for element_count in range(first_order, maximum_elements):
+        rc_network_list = solve_order(element_count, initial_guess)
+        element = table_row(element_count, rc_network_list)
+        network_combination.append(element)
+        if callback is not None:
+            callback({'stage': 'order', 'order': element_count, 'error': element[2], 'rms_error': element[4],
+                      'aic': element[5], 'bic': element[6],
+                      'best_error': min(item[2] for item in network_combination)})
+        if sweep_should_stop(network_combination, stop_ratio, criterion):
+            break
+        if warm_start:
+            initial_guess = insert_time_constant(rc_network_list, guess_time)
+    return network_combination
+
+
+def attach_shared_trace(name, length):
+    """
+    Pool initializer attaching the shared time and Zth trace
+    :param name: Shared memory block name
+    :param length: Number of samples
+    :return: None
+    """
+    block = shared_memory.SharedMemory(name=name)
+    shared_trace['block'] = block
+    shared_trace['trace'] = ndarray((2, length), dtype=float64, buffer=block.buf)
+
+
+def solve_shared_trace(element_count, default_tuple, initial_guess=None):
+    """
+    Pool task solving one network order on the shared trace
+    :param element_count: Number of RC pairs
+    :param default_tuple: Tuple from foster_default_value
+    :param initial_guess: RC tuple to start from, default guess is used if None
+    :return: RC tuple and the least_squares summary (see instrumentation.solve_record)
+    """
+    trace = shared_trace['trace']
+    records = []
+    network = solve_foster(trace[0], trace[1], element_count, default_tuple, initial_guess,
+                           callback=lambda event: records.append(event) if event['stage'] == 'solve' else None)
+    return network, records[-1]
+
+
+@contextmanager
+def shared_trace_pool(time, input_zth, workers):
+    """
+    Context manager providing a process pool with the time and Zth traces in shared memory.
+    The traces are placed in shared memory once instead of being pickled per task.
+    :param time: time in seconds
+    :param input_zth: zth
+    :param workers: Number of processes
+    :return: ProcessPoolExecutor whose workers run solve_shared_trace
+    """
+    length = len(time)
+    block = shared_memory.SharedMemory(create=True, size=max(2 * length * 8, 1))
+    try:
+        trace = ndarray((2, length), dtype=float64, buffer=block.buf)
+        trace[0] = time
+        trace[1] = input_zth
+        with ProcessPoolExecutor(max_workers=workers, initializer=attach_shared_trace,
+                                 initargs=(block.name, length)) as executor:
+            yield executor
+        del trace
+    finally:
+        block.close()
+        block.unlink()
+
+
+def solve_foster_pool(time, input_zth, element_counts, default_tuple, workers, executor=None):
+    """
+    Function solving several network orders on a process pool
+    :param time: time in seconds
+    :param input_zth: zth
+    :param element_counts: Network orders to solve
+    :param default_tuple: Tuple from foster_default_value
+    :param workers: Number of processes
+    :param executor: Pool from shared_trace_pool to reuse, a new pool is created if None
+    :return: List of (RC tuple, least_squares summary) in the order of element_counts
+    """
+    if executor is None:
+        with shared_trace_pool(time, input_zth, workers) as executor:
+            return solve_foster_pool(time, input_zth, element_counts, default_tuple, workers, executor)
+    return list(executor.map(solve_shared_trace, element_counts, [default_tuple] * len(element_counts)))
+
+
+def multi_start_guesses(time, input_zth, count_elements, starts, initial_guess=None, seed=0):
+    """
+    Function returning the starting networks of a multi-start fit.
+    The first start is initial_guess (or log-spaced time constants), the others draw their time constants
+    log-uniformly over the time span of the trace. The final Zth is shared equally between the R values.
+    :param time: time in seconds
+    :param input_zth: zth
+    :param count_elements: Number of RC pairs
+    :param starts: Number of starts
+    :param initial_guess: RC tuple of the first start
+    :param seed: Random seed, fixed so a multi-start fit is reproducible
+    :return: List of RC tuples
+    """
+    smallest, largest = positive_time_range(time)
+    r_value = float(input_zth[-1]) / count_elements or 0.1
+    rng = default_rng(seed)
+    tau_seeds = [log_spaced_tau(time, count_elements)]
+    for start in range(1, starts):
+        tau_seeds.append(sort(10 ** rng.uniform(np_log10(smallest), np_log10(largest), count_elements)))
+    guesses = [column_stack((full(count_elements, r_value), tau / r_value)).ravel() for tau in tau_seeds]
+    if initial_guess is not None:
+        guesses[0] = asarray(initial_guess, dtype=float)
+    return guesses
+
+
+def multi_start_summary(count_elements, results):
+    """
+    Function summarizing how widely the starts of a multi-start fit disagree
+    :param count_elements: Number of RC pairs
+    :param results: List of (RC tuple, least_squares summary), one per start
+    :return: Dictionary (stage multi_start, order, starts, best_start, best_cost, worst_cost, cost_spread,
+             tau_spread), cost_spread is worst / best cost - 1, tau_spread the largest distance in decades between
+             a sorted time constant of a start and of the best start
+    """
+    costs = [record['cost'] for network, record in results]
+    best_start = costs.index(min(costs))
+    best_tau = sort(split_foster_tuple(results[best_start][0])[1])
+    tau_spread = max(float(abs(np_log10(sort(split_foster_tuple(network)[1]) / best_tau)).max())
+                     for network, record in results)
+    return {'stage': 'multi_start', 'order': count_elements, 'starts': len(results), 'best_start': best_start,
+            'best_cost': costs[best_start], 'worst_cost': max(costs),
+            'cost_spread': max(costs) / costs[best_start] - 1 if costs[best_start] > 0 else inf,
+            'tau_spread': tau_spread}
+
+
+def solve_foster_multi_start(time, input_zth, count_elements, default_tuple, starts, initial_guess=None,
+                             callback=None, executor=None):
+    """
+    Curve Fitting RC Values from several starts, the fit of lowest cost is kept
+    :param time: time in seconds
+    :param input_zth: Zth to match values
+    :param count_elements: Number of RC pairs
+    :param default_tuple: Tuple from foster_default_value
+    :param starts: Number of starts (see multi_start_guesses)
+    :param initial_guess: RC tuple of the first start
+    :param callback: Called with the least_squares summary of every start and once with the multi_start summary
+                     (see multi_start_summary), residual evaluations are reported only without executor
+    :param executor: Pool from shared_trace_pool, the starts run one after the other if None
+    :return: Best RC tuple
+    """
+    guesses = multi_start_guesses(time, input_zth, count_elements, starts, initial_guess)
+    if executor is not None:
+        results = list(executor.map(solve_shared_trace, [count_elements] * len(guesses),
+                                    [default_tuple] * len(guesses), guesses))
+    else:
+        results = []
+        for guess in guesses:
+            records = []
+
+            def recorded(event):
+                if event['stage'] == 'solve':
+                    records.append(event)
+                elif callback is not None:
+                    callback(event)
+
+            results.append((solve_foster(time, input_zth, count_elements, default_tuple, guess, recorded),
+                            records[-1]))
+
+    summary = multi_start_summary(count_elements, results)
+    if callback is not None:
+        for network, record in results:
+            callback(record)
+        callback(summary)
+    return results[summary['best_start']][0]
+
+
+def sweep_mode(workers, warm_start, starts, spectrum_seed):
+    """
+    Function returning how the order sweep of create_foster_network runs
+    :param workers: Number of processes
+    :param warm_start: Every order seeded from the previous one
+    :param starts: Starts per order
+    :param spectrum_seed: One fit seeded from the time constant spectrum
+    :return: Sweep mode (spectrum seed, parallel orders, parallel starts or serial) and the processes it uses
+    """
+    if spectrum_seed:
+        return spectrum_seed_sweep, 1
+    if workers > 1 and starts > 1:
+        return parallel_starts_sweep, workers
+    if workers > 1 and not warm_start:
+        return parallel_orders_sweep, workers
+    return serial_sweep, 1
+
+
+def create_foster_network(time, input_zth, default_tuple, max_elements=None, return_table=False, workers=None,
+                          diagnostic_file=None, callback=None, return_report=False):
     """
     Function to create a Foster Network
     :param time: time in seconds
     :param input_zth: zth
-    :param diagnostic: Toggle to turn on Diagnostic
+    :param default_tuple: Tuple from foster_default_value (diagnostic, solver and sweep settings)
     :param max_elements: Max number of allowed elements
-    :return: RC network output combined
+    :param return_table: Also return the error versus order table
+    :param workers: Number of processes for the sweep, read from default_tuple if None.
+                    The orders only run in parallel with warm start off, with warm start every order is seeded
+                    from the previous one and the sweep stays serial with a RuntimeWarning. Multi-start runs
+                    parallelize the starts of each order instead. The mode that ran is in the run report
+                    (sweep_mode, sweep_workers). The result is always identical to workers=1.
+    :param diagnostic_file: .xlsx or .npz file for the diagnostic, a unique file name is used if None
+    :param callback: Called after every residual evaluation (see monitored_residual), after every least_squares
+                     call (see instrumentation.solve_record) and after every order with a dictionary
+                     (stage order, order, error, rms_error, aic, bic, best_error), may raise FosterCauer_Cancelled
+    :param return_report: Also return the run report (see instrumentation.new_report)
+    With points per decade set in default_tuple the orders are fitted on the log-time resampled trace,
+    errors in the table are always reported on the full trace. With spectrum seed set the sweep is replaced by one
+    fit, its order and time constants are the peaks of the time constant spectrum (see time_constant_spectrum).
+    :return: RC network output combined, the table of
+             (element count, network, error, error trace, RMS error, AIC, BIC) rows if return_table
+             and the run report if return_report
     """
     diagnostic = default_tuple[4]
+    warm_start = get_default_option(default_tuple, warm_start_index, True)
+    stop_ratio = get_default_option(default_tuple, stop_ratio_index, None)
+    criterion = get_default_option(default_tuple, criterion_index, None)
+    workers = workers or get_default_option(default_tuple, workers_index, 1) or 1
+    points_per_decade = get_default_option(default_tuple, resample_index, None)
+    spectrum_seed = get_default_option(default_tuple, spectrum_seed_index, False)
+    chunk_size = get_default_option(default_tuple, chunk_size_index, None)
+    starts = get_default_option(default_tuple, multi_start_index, 1) or 1
     maximum_elements = max_elements or maximum_network_elements
-    delete_diagnostic_file()
+    report = instrumentation.new_report() if return_report else None
+    if report is not None:
+        callback = instrumentation.reporting_callback(report, callback)
+    start = perf_counter()
+    mode, mode_workers = sweep_mode(workers, warm_start, starts, spectrum_seed)
+    if workers > 1 and mode_workers == 1:
+        warnings.warn("Foster sweep runs serially, " + str(workers) + " workers need warm start off or multi-start "
+                      "(" + mode + " sweep)", RuntimeWarning, stacklevel=2)
+    if report is not None:
+        report['sweep_mode'] = mode
+        report['sweep_workers'] = mode_workers
+
+    fit_time, fit_zth = time, input_zth
+    if points_per_decade:
+        with instrumentation.stage_timer(report, 'resample'):
+            fit_time, fit_zth = trace_tools.resample_log_time(time, input_zth, points_per_decade)
+    pool_networks = None
     element_count = 1
-    network_combination = []
-    while element_count != maximum_elements:
-        rc_network_list = solve_foster(time, input_zth, element_count, default_tuple)
-        error = error_func(rc_network_list, time, input_zth)
-        sum_error_square = sqrt(sum(map(lambda i: i * i, error)))
-        element = (element_count, rc_network_list, sum_error_square, error)
-        network_combination.append(element)
+    initial_guess = None
+    with ExitStack() as pool_stack:
+        if spectrum_seed:
+            # ONE FIT, ORDER AND TIME CONSTANTS FROM THE PEAKS OF THE TIME CONSTANT SPECTRUM
+            with instrumentation.stage_timer(report, 'spectrum'):
+                tau, spectrum = time_constant_spectrum.time_constant_spectrum(time, input_zth)
+                initial_guess = time_constant_spectrum.spectrum_peaks(tau, spectrum, max_count=maximum_elements - 1,
+                                                                      max_tau=positive_time_range(time)[1])
+            element_count = len(initial_guess) // 2
+            maximum_elements = element_count + 1
+        elif mode == parallel_orders_sweep:
+            # COLD FITS ONLY, A WARM STARTED ORDER NEEDS THE PREVIOUS ORDER
+            with instrumentation.stage_timer(report, 'sweep'):
+                pool_networks = solve_foster_pool(fit_time, fit_zth, list(range(1, maximum_elements)), default_tuple,
+                                                  workers)
+        # ONE POOL FOR THE STARTS OF ALL ORDERS
+        executor = None
+        if mode == parallel_starts_sweep:
+            executor = pool_stack.enter_context(shared_trace_pool(fit_time, fit_zth, workers))
+
+        def solve_order(order, order_guess):
+            with instrumentation.stage_timer(report, 'sweep'):
+                if pool_networks is not None:
+                    rc_network_list, record = pool_networks[order - 1]
+                    if callback is not None:
+                        callback(record)
+                    return rc_network_list
+                elif starts > 1:
+                    return solve_foster_multi_start(fit_time, fit_zth, order, default_tuple, starts, order_guess,
+                                                    callback, executor)
+                return solve_foster(fit_time, fit_zth, order, default_tuple, order_guess, callback)
+
+        def table_row(order, rc_network_list):
+            with instrumentation.stage_timer(report, 'error'):
+                if chunk_size:
+                    return chunked_table_row(order, rc_network_list, time, input_zth, chunk_size)
+                return network_table_row(order, rc_network_list, time, input_zth)
+
+        network_combination = sweep_orders(solve_order, table_row, element_count, maximum_elements, warm_start,
+                                           stop_ratio, criterion, fit_time, callback, initial_guess)
+
+    if diagnostic:
+        with instrumentation.stage_timer(report, 'diagnostic'):
+            diagnostic_file = write_diagnostic(network_combination, time, input_zth, diagnostic_file)
+
+    with instrumentation.stage_timer(report, 'selection'):
+        selected = select_foster_network(network_combination, criterion)
+    output_network = selected[1]
+
+    output = (output_network,)
+    if return_table:
+        output += (network_combination,)
+    if report is not None:
+        report['selected_order'] = selected[0]
+        report['diagnostic_file'] = diagnostic_file if diagnostic else None
+        report['total_time'] = perf_counter() - start
+        output += (report,)
+    if len(output) == 1:
+        return output_network
+    return output
 
-        if diagnostic:
-            write_diagnostic(element, time, input_zth)
-        element_count += 1
 
-    minimal = 100000000000
-    minimal_location = -1
-    for item in network_combination:
-        if minimal > item[2]:
-            minimal = item[2]
-            minimal_location = network_combination.index(item)
+def cache_settings(default_tuple):
+    """
+    Function returning the settings of the default tuple which change a result
+    :param default_tuple: Tuple from foster_default_value
+    :return: Tuple of settings
+    """
+    return tuple(item for index, item in enumerate(default_tuple or ()) if index not in cache_ignored_indices)
+
 
-    output_network = network_combination[minimal_location][1]
-    return output_network
+def cache_directory(default_tuple):
+    """
+    Function returning the result cache directory
+    :param default_tuple: Tuple from foster_default_value
+    :return: Directory, None if the cache is disabled or a diagnostic file is requested
+    """
+    if get_default_option(default_tuple, 4, False) or get_default_option(default_tuple, 5, False):
+        return None
+    return get_default_option(default_tuple, cache_directory_index, None)
 
 
-def get_foster_network(file, default_values):
+def cached_foster_network(time, input_zth, default_values, callback=None):
+    """
+    Function to create a Foster network, reusing a cached result of the same trace and settings
+    :param time: time in seconds
+    :param input_zth: zth
+    :param default_values: Tuple from foster_default_value
+    :param callback: Progress callback of create_foster_network
+    :return: RC Network, table of [element count, network, error, RMS error, AIC, BIC] rows and run report
+    """
+    directory = cache_directory(default_values)
+    key = None
+    if directory is not None:
+        key = result_cache.trace_key('foster', (time, input_zth), cache_settings(default_values),
+                                     foster_solver_version)
+        report = instrumentation.new_report()
+        with instrumentation.stage_timer(report, 'cache'):
+            cached = result_cache.load_result(directory, key)
+        if cached is not None:
+            report['cache'] = 'hit'
+            report['selected_order'] = len(cached['network']) // 2
+            return asarray(cached['network']), cached['table'], report
+
+    network_rc, network_combination, report = create_foster_network(time, input_zth, default_values,
+                                                                    return_table=True, callback=callback,
+                                                                    return_report=True)
+    table = [[row[0], [float(i) for i in row[1]], row[2], row[4], row[5], row[6]] for row in network_combination]
+    report['cache'] = 'disabled'
+    if directory is not None:
+        report['cache'] = 'miss'
+        with instrumentation.stage_timer(report, 'cache'):
+            result_cache.store_result(directory, key, {'network': [float(i) for i in network_rc], 'table': table},
+                                      get_default_option(default_values, cache_size_index, 0))
+    return network_rc, table, report
+
+
+def get_foster_network(file, default_values, callback=None, return_report=False):
     """
     Function to create a Foster network from a CSV file
     :param file: CSV File
+    :param callback: Progress callback of create_foster_network
+    :param return_report: Also return the run report, including the parse and sanity check stages
     :return: RC Network
     """
     if file.strip() or not file.isspace():
-        zth_trace = read_csv_file(file)
-        zth_trace = asarray(zth_trace)
+        start = perf_counter()
+        parse_start = perf_counter()
+        time, zth = read_csv_columns(file, get_default_option(default_values, float32_index, False))
         default_values = default_values
+        parse_time = perf_counter() - parse_start
 
-        if sanity_check(zth_trace[:, 0], zth_trace[:, 1]):
+        sanity_start = perf_counter()
+        if sanity_check(time, zth):
+            sanity_time = perf_counter() - sanity_start
             try:
-                network_rc = create_foster_network(zth_trace[:, 0], zth_trace[:, 1], default_values)
+                network_rc, table, report = cached_foster_network(time, zth, default_values, callback)
+                if return_report:
+                    report['stages']['parse'] = parse_time
+                    report['stages']['sanity'] = sanity_time
+                    report['total_time'] = perf_counter() - start
+                    return network_rc, report
                 return network_rc
+            except FC_Error_list.FosterCauer_Error:
+                raise
             except IndexError:
                 raise FC_Error_list.FosterCauer_Error("Input file not organized correctly, Refer documentation")
             except Exception:
@@ -429,40 +1542,15 @@ def list_log10(list):
 #     plt.show()
 
 
-def sort_text_file(filename):
-    if not path.exists(filename):
-        raise FC_Error_list.FosterCauer_Error("File not found")
-
-    else:
-        try:
-            input_file = open(filename, 'r')
-            line = input_file.readline()
-            cnt = 1
-
-            while line:
-                # print("Line {}: {}".format(cnt, line.strip()))
-                line = input_file.readline()
-                cnt += 1
-            factor = 1 + (cnt // 1048576)
-            input_file = open(filename, 'r')
-            line = input_file.readline()
-            cnt = 1
-            final_list = []
-
-            while line:
-                if (cnt % factor == 0):
-                    final_list.append(line)
-                line = input_file.readline()
-                cnt += 1
-
-            with open('reduced_file.txt', 'w+') as f:
-                for item in final_list:
-                    f.write("%s" % item)
-
-
-
-        except IndexError:
-            raise FC_Error_list.FosterCauer_Error("Input file not organized correctly, Refer documentation")
+def sort_text_file(filename, output='reduced_file.txt', grid='stride'):
+    """
+    Function to reduce a large trace file to about one million samples
+    :param filename: CSV or text file
+    :param output: File path for the reduced trace, returned as an array if None
+    :param grid: stride (every k-th sample) or log (samples on a logarithmic time grid)
+    :return: Output file path or array (see trace_tools.reduce_trace_file)
+    """
+    return trace_tools.reduce_trace_file(filename, output, grid)
 
 
 if __name__ == "__main__":
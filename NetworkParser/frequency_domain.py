@@ -0,0 +1,278 @@
+# !/usr/bin/env python3
+# coding: utf-8
+__author__ = "Shushanth Prabhu"
+__email__ = "shushanth@gmail.com"
+__version__ = "1.0"
+
+# THERMAL IMPEDANCE Zth(jw) OF FOSTER AND CAUER NETWORKS AND FOSTER FITTING ON SPECTRAL DATA
+# FREQUENCIES ARE IN Hz, w = 2 pi f
+
+from NetworkParser import foster_solver
+from NetworkParser import trace_tools
+from NetworkParser import instrumentation
+from NetworkParser import FC_Error_list
+from scipy.optimize import least_squares
+from numpy import asarray, atleast_2d, zeros, empty, concatenate, clip, column_stack, inf, pi
+from numpy import abs as np_abs, angle
+from time import perf_counter
+
+
+def angular_frequency(frequency):
+    """
+    Function converting frequencies to angular frequencies
+    :param frequency: Frequencies in Hz
+    :return: Angular frequencies in rad/s
+    """
+    return 2 * pi * asarray(frequency, dtype=float)
+
+
+def foster_impedance(foster_networks, frequency):
+    """
+    Function returning Zth(jw) = sum R / (1 + jw tau) of Foster networks
+    :param foster_networks: Foster RC tuple, or array with one Foster network of the same order per row
+    :param frequency: Frequencies in Hz
+    :return: Complex impedance with one row per network, in the shape of frequency for a single network
+    """
+    foster_networks = asarray(foster_networks, dtype=float)
+    networks = atleast_2d(foster_networks)
+    omega = angular_frequency(frequency).ravel()
+    r_values = networks[:, 0::2]
+    tau = r_values * networks[:, 1::2]
+    impedance = zeros((networks.shape[0], len(omega)), dtype=complex)
+    # ONE POLE AT A TIME KEEPS THE MEMORY AT NETWORKS x FREQUENCIES
+    for index in range(r_values.shape[1]):
+        impedance += r_values[:, index, None] / (1 + 1j * omega[None, :] * tau[:, index, None])
+    impedance = impedance.reshape((networks.shape[0],) + asarray(frequency).shape)
+    return impedance[0] if foster_networks.ndim == 1 else impedance
+
+
+def cauer_impedance(cauer_networks, frequency):
+    """
+    Function returning Zth(jw) of Cauer ladders by the ladder recursion from the ambient end
+    Z = 1 / (jw C_i + 1 / (R_i + Z_i+1)) with Z = 0 behind the last R
+    :param cauer_networks: Cauer network list, or array with one Cauer network of the same order per row
+    :param frequency: Frequencies in Hz
+    :return: Complex impedance with one row per network, in the shape of frequency for a single network
+    """
+    cauer_networks = asarray(cauer_networks, dtype=float)
+    networks = atleast_2d(cauer_networks)
+    omega = angular_frequency(frequency).ravel()
+    cauer_c = networks[:, 0::2]
+    cauer_r = networks[:, 1::2]
+    impedance = zeros((networks.shape[0], len(omega)), dtype=complex)
+    for index in range(cauer_c.shape[1] - 1, -1, -1):
+        impedance = 1 / (1j * omega[None, :] * cauer_c[:, index, None] + 1 / (cauer_r[:, index, None] + impedance))
+    impedance = impedance.reshape((networks.shape[0],) + asarray(frequency).shape)
+    return impedance[0] if cauer_networks.ndim == 1 else impedance
+
+
+def bode(impedance):
+    """
+    Function returning the Bode curves of an impedance
+    :param impedance: Complex impedance
+    :return: Magnitude and phase in degrees
+    """
+    return np_abs(impedance), angle(impedance, deg=True)
+
+
+def read_impedance_file(file):
+    """
+    Function to read spectral data with frequency in Hz, real and imaginary part of Zth in the first three columns
+    :param file: CSV or text file
+    :return: Frequency array and complex Zth array
+    """
+    trace = trace_tools.load_trace(file)
+    if trace.shape[1] < 3:
+        raise FC_Error_list.FosterCauer_Error("Input file not organized correctly, Refer documentation")
+    if (trace[:, 0] <= 0).any():
+        raise FC_Error_list.FosterCauer_Error("Frequencies must be positive")
+    return trace[:, 0], trace[:, 1] + 1j * trace[:, 2]
+
+
+def stack_complex(values):
+    """
+    Function stacking the real parts over the imaginary parts along the first axis
+    :param values: Complex array
+    :return: Real array with twice the rows
+    """
+    return concatenate((values.real, values.imag))
+
+
+def frequency_error_func(tpl, omega, input_z):
+    """
+    Function returning the real and imaginary Error between the Foster impedance and the measured impedance
+    :param tpl: Contain the RC Pairs with R Value First and C Value Seconds
+    :param omega: Angular frequencies in rad/s
+    :param input_z: Measured complex impedance
+    :return: Error Function, real parts followed by imaginary parts
+    """
+    r_values, tau = foster_solver.split_foster_tuple(tpl)
+    pole = 1 / (1 + 1j * omega[:, None] * tau)
+    return stack_complex(pole @ r_values - input_z)
+
+
+def frequency_error_jac(tpl, omega, input_z):
+    """
+    Function returning the analytic Jacobian of frequency_error_func
+    d/dR = 1 / (1 + jw tau) - jw tau / (1 + jw tau)^2
+    d/dC = -jw R^2 / (1 + jw tau)^2
+    :param tpl: Contain the RC Pairs with R Value First and C Value Seconds
+    :param omega: Angular frequencies in rad/s
+    :param input_z: Measured complex impedance (unused, kept to match frequency_error_func)
+    :return: Jacobian with one row per real and imaginary residual and the columns ordered as tpl
+    """
+    tpl = asarray(tpl, dtype=float)
+    r_values, tau = foster_solver.split_foster_tuple(tpl)
+    pole = 1 / (1 + 1j * omega[:, None] * tau)
+    jw_pole_square = 1j * omega[:, None] * pole * pole
+    jacobian = empty((len(omega), len(tpl)), dtype=complex)
+    jacobian[:, 0::2] = pole - jw_pole_square * tau
+    jacobian[:, 1::2] = -jw_pole_square * r_values * r_values
+    return stack_complex(jacobian)
+
+
+def frequency_initial_guess(omega, input_z, count_elements, lower_bound, upper_bound):
+    """
+    Function returning a starting network for spectral data
+    Time constants are log-spaced over 1 / w, the DC resistance (real part at the lowest frequency) is shared equally
+    :param omega: Angular frequencies in rad/s
+    :param input_z: Measured complex impedance
+    :param count_elements: Number of RC pairs
+    :param lower_bound: Lower bound of R and C
+    :param upper_bound: Upper bound of R and C
+    :return: RC tuple
+    """
+    tau = foster_solver.log_spaced_tau(1 / omega, count_elements)
+    r_value = input_z[omega.argmin()].real / count_elements
+    r_values = clip(zeros(count_elements) + r_value, lower_bound, upper_bound)
+    return clip(column_stack((r_values, tau / r_values)).ravel(), lower_bound, upper_bound)
+
+
+def solve_foster_frequency_separable(omega, input_z, count_elements, lower_bound, upper_bound, ftol, xtol,
+                                     initial_guess=None, callback=None):
+    """
+    Curve Fitting RC Values on spectral data by variable projection (see foster_solver.variable_projection)
+    :param omega: Angular frequencies in rad/s
+    :param input_z: Measured complex impedance
+    :param count_elements: Number of RC pairs.
+    :param initial_guess: RC tuple to start from, time constants are log-spaced over 1 / w if None
+    :param callback: Called after every residual evaluation (see foster_solver.monitored_residual)
+    :return: Tuple containing R and C values in the solve_foster layout and the least_squares result
+    """
+    if initial_guess is None:
+        initial_tau = foster_solver.log_spaced_tau(1 / omega, count_elements)
+    else:
+        initial_tau = foster_solver.split_foster_tuple(initial_guess)[1]
+
+    def basis(tau):
+        return stack_complex(1 / (1 + 1j * omega[:, None] * tau))
+
+    def derivative(tau, r_values, tau_basis):
+        pole = 1 / (1 + 1j * omega[:, None] * tau)
+        return stack_complex(-1j * omega[:, None] * pole * pole * r_values)
+
+    tau, r_values, output = foster_solver.variable_projection(basis, derivative, stack_complex(input_z), initial_tau,
+                                                              count_elements, lower_bound, upper_bound, ftol, xtol,
+                                                              callback)
+    tpl_final = column_stack((r_values, tau / r_values)).ravel()
+    return tpl_final, output
+
+
+def solve_foster_frequency(frequency, input_z, count_elements, default_tuple=None, initial_guess=None,
+                           callback=None):
+    """
+    Curve Fitting RC Values on spectral data Zth(jw), with the options of solve_foster
+    :param frequency: Frequencies in Hz
+    :param input_z: Measured complex impedance
+    :param count_elements: Number of RC pairs.
+    :param default_tuple: Tuple from foster_default_value, bounds, tolerances and the solver mode are read from it
+    :param initial_guess: RC tuple to start from (warm start), see frequency_initial_guess if None
+    :param callback: Called after every residual evaluation and once with the least_squares summary
+    :return: tuple containing R and C List.
+    """
+    omega = angular_frequency(frequency)
+    input_z = asarray(input_z, dtype=complex)
+    if omega.shape != input_z.shape or (omega <= 0).any():
+        raise FC_Error_list.FosterCauer_Error("Frequency and impedance must have the same length, frequencies > 0")
+    lower_bound = foster_solver.get_default_option(default_tuple, 0, 0.00000001)
+    upper_bound = foster_solver.get_default_option(default_tuple, 1, inf)
+    ftol = foster_solver.get_default_option(default_tuple, 2, 1e-08)
+    xtol = foster_solver.get_default_option(default_tuple, 3, 1e-08)
+    solver = foster_solver.get_default_option(default_tuple, foster_solver.foster_solver_index,
+                                              foster_solver.joint_solver)
+
+    start = perf_counter()
+    if solver == foster_solver.separable_solver:
+        tpl_final, output = solve_foster_frequency_separable(omega, input_z, count_elements, lower_bound,
+                                                             upper_bound, ftol, xtol, initial_guess, callback)
+    elif solver == foster_solver.joint_solver:
+        if initial_guess is None:
+            initial_guess = frequency_initial_guess(omega, input_z, count_elements, lower_bound, upper_bound)
+        else:
+            initial_guess = clip(asarray(initial_guess, dtype=float), lower_bound, upper_bound)
+        residual = frequency_error_func
+        if callback is not None:
+            residual = foster_solver.monitored_residual(frequency_error_func, callback, count_elements)
+        output = least_squares(residual, x0=initial_guess, jac=frequency_error_jac, bounds=(lower_bound, upper_bound),
+                               method='trf', ftol=ftol, xtol=xtol, gtol=1e-08, x_scale=1.0, loss='linear',
+                               args=(omega, input_z))
+        tpl_final = output.x
+    else:
+        raise FC_Error_list.FosterCauer_Error("Unknown Foster solver " + str(solver))
+
+    if callback is not None:
+        callback(instrumentation.solve_record(output, count_elements, solver, perf_counter() - start))
+    return tpl_final
+
+
+def frequency_table_row(element_count, rc_network_list, frequency, input_z):
+    """
+    Function to build one row of the error versus order table on spectral data
+    :param element_count: Number of RC pairs
+    :param rc_network_list: Solved RC tuple
+    :param frequency: Frequencies in Hz
+    :param input_z: Measured complex impedance
+    :return: Tuple (element count, network, error, complex error trace, RMS error, AIC, BIC) as in
+             foster_solver.network_table_row, real and imaginary parts count as separate samples
+    """
+    error = foster_impedance(rc_network_list, frequency) - input_z
+    return foster_solver.order_table_row(element_count, rc_network_list,
+                                         float((error.real @ error.real) + (error.imag @ error.imag)),
+                                         2 * len(error), error)
+
+
+def create_foster_network_frequency(frequency, input_z, default_tuple, max_elements=None, return_table=False,
+                                    callback=None):
+    """
+    Function to create the Foster network of spectral data by a model order sweep as create_foster_network,
+    warm start, stop ratio and criterion are read from default_tuple
+    :param frequency: Frequencies in Hz
+    :param input_z: Measured complex impedance
+    :param default_tuple: Tuple from foster_default_value
+    :param max_elements: Sweep stops before this order, maximum_network_elements if None
+    :param return_table: Also return the error versus order table
+    :param callback: Progress callback as in create_foster_network
+    :return: RC network, and the table of (element count, network, error, error trace, RMS error, AIC, BIC) rows
+             if return_table
+    """
+    frequency = asarray(frequency, dtype=float)
+    input_z = asarray(input_z, dtype=complex)
+    warm_start = foster_solver.get_default_option(default_tuple, foster_solver.warm_start_index, True)
+    stop_ratio = foster_solver.get_default_option(default_tuple, foster_solver.stop_ratio_index, None)
+    criterion = foster_solver.get_default_option(default_tuple, foster_solver.criterion_index, None)
+    maximum_elements = max_elements or foster_solver.maximum_network_elements
+    equivalent_time = 1 / angular_frequency(frequency)
+
+    def solve_order(order, initial_guess):
+        return solve_foster_frequency(frequency, input_z, order, default_tuple, initial_guess, callback)
+
+    def table_row(order, rc_network_list):
+        return frequency_table_row(order, rc_network_list, frequency, input_z)
+
+    network_combination = foster_solver.sweep_orders(solve_order, table_row, 1, maximum_elements, warm_start,
+                                                     stop_ratio, criterion, equivalent_time, callback)
+
+    output_network = foster_solver.select_foster_network(network_combination, criterion)[1]
+    if return_table:
+        return output_network, network_combination
+    return output_network
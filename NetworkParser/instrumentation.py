@@ -0,0 +1,75 @@
+# !/usr/bin/env python3
+# coding: utf-8
+__author__ = "Shushanth Prabhu"
+__email__ = "shushanth@gmail.com"
+__version__ = "1.0"
+
+from time import perf_counter
+from contextlib import contextmanager
+
+
+def new_report():
+    """
+    Function returning an empty run report
+    stages: wall time in s per stage, solves: one record per least_squares call,
+    orders: one record per fitted network order, multi_starts: one spread summary per multi-start order,
+    sweep_mode: how the orders ran (see foster_solver.sweep_mode), sweep_workers: processes used by the sweep,
+    cache: lookup of the requested result (hit, miss or disabled), foster_cache: lookup of the Foster network a
+    Cauer network was converted from
+    :return: Report dictionary
+    """
+    return {'stages': {}, 'solves': [], 'orders': [], 'multi_starts': [], 'selected_order': None, 'cache': None,
+            'foster_cache': None, 'diagnostic_file': None, 'total_time': 0.0, 'sweep_mode': None,
+            'sweep_workers': None}
+
+
+@contextmanager
+def stage_timer(report, name):
+    """
+    Context manager adding the wall time of a block to a report stage
+    :param report: Report dictionary, nothing is recorded if None
+    :param name: Stage name
+    :return: None
+    """
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        if report is not None:
+            report['stages'][name] = report['stages'].get(name, 0.0) + perf_counter() - start
+
+
+def solve_record(output, order, solver, wall_time):
+    """
+    Function summarizing a least_squares result
+    :param output: OptimizeResult of least_squares
+    :param order: Number of RC pairs
+    :param solver: Foster solver mode
+    :param wall_time: Wall time of the call in s
+    :return: Dictionary (stage solve, order, solver, nfev, njev, status, message, cost, optimality, wall_time)
+    """
+    return {'stage': 'solve', 'order': order, 'solver': solver, 'nfev': int(output.nfev),
+            'njev': None if output.njev is None else int(output.njev), 'status': int(output.status),
+            'message': str(output.message), 'cost': float(output.cost), 'optimality': float(output.optimality),
+            'wall_time': wall_time}
+
+
+def reporting_callback(report, callback):
+    """
+    Function returning a callback which records solve, order and multi_start events in a report and forwards all
+    events
+    :param report: Report dictionary
+    :param callback: User callback or None
+    :return: Callback
+    """
+    def recorded(event):
+        if event['stage'] == 'solve':
+            report['solves'].append(dict(event))
+        elif event['stage'] == 'order':
+            report['orders'].append(dict(event))
+        elif event['stage'] == 'multi_start':
+            report['multi_starts'].append(dict(event))
+        if callback is not None:
+            callback(event)
+
+    return recorded
@@ -0,0 +1,11 @@
+# !/usr/bin/env python3
+# coding: utf-8
+__author__ = "Shushanth Prabhu"
+__email__ = "shushanth@gmail.com"
+__version__ = "1.0"
+
+# NETWORK TYPES SHARED BY THE BATCH RUN, THE COMMAND LINE AND THE EXPORTS, KEPT FREE OF IMPORTS SO ANY MODULE CAN
+# IMPORT IT
+foster_network = 'foster'
+cauer_network = 'cauer'
+both_networks = 'both'
@@ -0,0 +1,178 @@
+# !/usr/bin/env python3
+# coding: utf-8
+__author__ = "Shushanth Prabhu"
+__email__ = "shushanth@gmail.com"
+__version__ = "1.0"
+
+# INCREMENTAL FOSTER FIT OF A MEASUREMENT WHICH IS STILL RUNNING
+# SAMPLES ARE BIN AVERAGED ON LOG-SPACED TIME BINS AS THEY ARRIVE, SO MEMORY DOES NOT GROW WITH THE TEST DURATION.
+# THE NETWORK IS REFITTED, WARM STARTED FROM THE PREVIOUS ONE, EACH TIME THE TRACE GREW BY decades_per_refit.
+
+from NetworkParser import foster_solver
+from NetworkParser import trace_tools
+from NetworkParser import FC_Error_list
+from numpy import asarray, zeros, concatenate, bincount, floor, log10, int64, float64
+
+# REFIT WHEN THE TRACE GREW BY THIS MANY DECADES OF TIME
+online_decades_per_refit = 0.25
+# LOG-SPACED TIME BINS PER DECADE
+online_points_per_decade = 50
+# BINS NEEDED BEFORE THE FIRST FIT
+online_minimum_bins = 10
+
+
+def new_online_fit(default_tuple=None, decades_per_refit=online_decades_per_refit,
+                   points_per_decade=online_points_per_decade, max_elements=None):
+    """
+    Function returning the state of an incremental Foster fit
+    Without a criterion in default_tuple the order is selected by BIC, the lowest error would always take the
+    highest order as the trace grows.
+    :param default_tuple: Tuple from foster_default_value
+    :param decades_per_refit: Refit when the trace grew by this many decades of time
+    :param points_per_decade: Log-spaced time bins per decade
+    :param max_elements: Order limit as in create_foster_network
+    :return: Online fit dictionary, network is the current best network (None before the first fit)
+    """
+    default_tuple = list(default_tuple or foster_solver.foster_default_value())
+    if foster_solver.get_default_option(default_tuple, foster_solver.criterion_index, None) is None:
+        default_tuple[foster_solver.criterion_index] = foster_solver.bic_criterion
+    return {'default_tuple': tuple(default_tuple), 'decades_per_refit': decades_per_refit,
+            'points_per_decade': points_per_decade,
+            'max_elements': max_elements or foster_solver.maximum_network_elements,
+            'start_time': [], 'start_zth': [], 'bin_offset': None, 'bin_time': zeros(0), 'bin_zth': zeros(0),
+            'bin_count': zeros(0), 'sample_count': 0, 'last_time': None, 'fitted_time': None,
+            'network': None, 'rms_error': None, 'refits': 0}
+
+
+def add_samples(fit, time, zth, callback=None):
+    """
+    Function adding a chunk of samples to an online fit and refitting when enough new decades arrived
+    :param fit: Dictionary from new_online_fit
+    :param time: time in seconds, increasing across chunks
+    :param zth: zth
+    :param callback: Progress callback of the solver, may raise FosterCauer_Cancelled
+    :return: True if the network was refitted
+    """
+    time = asarray(time, dtype=float64).ravel()
+    zth = asarray(zth, dtype=float64).ravel()
+    if len(time) != len(zth):
+        raise FC_Error_list.FosterCauer_Error("Time and Zth chunks must have the same length")
+    if not len(time):
+        return False
+    if (fit['last_time'] is not None and time[0] < fit['last_time']) or (time[1:] < time[:-1]).any():
+        raise FC_Error_list.FosterCauer_Error("Time trace is Negative")
+    fit['last_time'] = time[-1]
+    fit['sample_count'] += len(time)
+
+    positive = time > 0
+    fit['start_time'].extend(time[~positive])
+    fit['start_zth'].extend(zth[~positive])
+    if positive.any():
+        bins = floor(log10(time[positive]) * fit['points_per_decade']).astype(int64)
+        if fit['bin_offset'] is None:
+            fit['bin_offset'] = bins[0]
+        bins -= fit['bin_offset']
+        length = max(len(fit['bin_count']), bins[-1] + 1)
+        for key, weights in (('bin_time', time[positive]), ('bin_zth', zth[positive]), ('bin_count', None)):
+            values = zeros(length)
+            values[:len(fit[key])] = fit[key]
+            values += bincount(bins, weights=weights, minlength=length)
+            fit[key] = values
+
+    if refit_due(fit):
+        refit_online(fit, callback)
+        return True
+    return False
+
+
+def online_trace(fit):
+    """
+    Function returning the bin averaged trace of an online fit
+    :param fit: Dictionary from new_online_fit
+    :return: Time and Zth arrays
+    """
+    filled = fit['bin_count'] > 0
+    return (concatenate((fit['start_time'], fit['bin_time'][filled] / fit['bin_count'][filled])),
+            concatenate((fit['start_zth'], fit['bin_zth'][filled] / fit['bin_count'][filled])))
+
+
+def refit_due(fit):
+    """
+    Function deciding if an online fit should be refitted
+    :param fit: Dictionary from new_online_fit
+    :return: True once enough bins arrived for the first fit and then every decades_per_refit decades
+    """
+    if (fit['bin_count'] > 0).sum() < online_minimum_bins:
+        return False
+    if fit['fitted_time'] is None:
+        return True
+    return log10(fit['last_time'] / fit['fitted_time']) >= fit['decades_per_refit']
+
+
+def refit_online(fit, callback=None):
+    """
+    Function refitting an online fit on the trace received so far
+    The first fit runs the order sweep of create_foster_network, later fits only solve the current order and one
+    more RC pair, warm started from the previous network, and keep the better by the criterion.
+    :param fit: Dictionary from new_online_fit
+    :param callback: Progress callback of the solver
+    :return: Current network
+    """
+    time, zth = online_trace(fit)
+    default_tuple = fit['default_tuple']
+    criterion = foster_solver.get_default_option(default_tuple, foster_solver.criterion_index, None)
+    if fit['network'] is None:
+        network_combination = foster_solver.create_foster_network(time, zth, default_tuple, fit['max_elements'],
+                                                                  return_table=True, callback=callback)[1]
+    else:
+        element_count = len(fit['network']) // 2
+        network_combination = [foster_solver.network_table_row(
+            element_count, foster_solver.solve_foster(time, zth, element_count, default_tuple, fit['network'],
+                                                      callback), time, zth)]
+        if element_count + 1 < fit['max_elements']:
+            initial_guess = foster_solver.insert_time_constant(fit['network'], time)
+            network_combination.append(foster_solver.network_table_row(
+                element_count + 1, foster_solver.solve_foster(time, zth, element_count + 1, default_tuple,
+                                                              initial_guess, callback), time, zth))
+
+    selected = foster_solver.select_foster_network(network_combination, criterion)
+    fit['network'] = selected[1]
+    fit['rms_error'] = selected[4]
+    fit['fitted_time'] = fit['last_time']
+    fit['refits'] += 1
+    if callback is not None:
+        callback({'stage': 'online', 'order': selected[0], 'rms_error': selected[4], 'time': fit['last_time'],
+                  'samples': fit['sample_count'], 'refits': fit['refits']})
+    return fit['network']
+
+
+def online_network(fit):
+    """
+    Function returning the current best network of an online fit
+    :param fit: Dictionary from new_online_fit
+    :return: RC tuple with R Value First and C Value Seconds, None before the first fit
+    """
+    return fit['network']
+
+
+def follow_trace_file(file, default_tuple=None, poll_interval=1.0, idle_timeout=None, callback=None,
+                      decades_per_refit=online_decades_per_refit):
+    """
+    Function fitting a trace file while it is being written
+    :param file: CSV or text file with time in the first and Zth in the second column
+    :param default_tuple: Tuple from foster_default_value
+    :param poll_interval: Seconds to wait when no new data was written
+    :param idle_timeout: Stop after this many seconds without new data, follow forever if None
+    :param callback: Progress callback of the solver
+    :param decades_per_refit: Refit when the trace grew by this many decades of time
+    :return: Generator of the online fit dictionary after every refit, a final refit is made when the file stops
+    """
+    fit = new_online_fit(default_tuple, decades_per_refit)
+    for chunk in trace_tools.tail_trace_file(file, poll_interval, idle_timeout):
+        if chunk.shape[1] < 2:
+            raise FC_Error_list.FosterCauer_Error("Input file not organized correctly, Refer documentation")
+        if add_samples(fit, chunk[:, 0], chunk[:, 1], callback):
+            yield fit
+    if fit['fitted_time'] != fit['last_time'] and (fit['bin_count'] > 0).sum() >= online_minimum_bins:
+        refit_online(fit, callback)
+        yield fit
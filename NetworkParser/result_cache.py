@@ -0,0 +1,110 @@
+# !/usr/bin/env python3
+# coding: utf-8
+__author__ = "Shushanth Prabhu"
+__email__ = "shushanth@gmail.com"
+__version__ = "1.0"
+
+from numpy import asarray, ascontiguousarray
+from hashlib import sha256
+from os import path, makedirs, listdir, remove, replace, utime, getpid
+import json
+
+# BUMP WHEN THE STORED RESULT LAYOUT CHANGES
+cache_format = 1
+cache_extension = '.json'
+# SAMPLES PER HASHED CHUNK OF A TRACE
+hash_chunk_size = 65536
+
+
+def trace_key(kind, traces, settings, version):
+    """
+    Function returning the content address of a result
+    :param kind: Result type (foster or cauer)
+    :param traces: Arrays the result is computed from (time, Zth)
+    :param settings: Settings that change the result
+    :param version: Solver version, bumped whenever the solver gives other results for the same input
+    :return: Hex digest
+    """
+    digest = sha256()
+    digest.update(repr((cache_format, kind, version, tuple(settings))).encode())
+    for trace in traces:
+        trace = asarray(trace)
+        digest.update((str(trace.shape) + trace.dtype.str).encode())
+        # CHUNK BY CHUNK, A STRIDED TRACE IS ONLY COPIED ONE CHUNK AT A TIME
+        for start in range(0, len(trace), hash_chunk_size):
+            digest.update(memoryview(ascontiguousarray(trace[start:start + hash_chunk_size])))
+    return digest.hexdigest()
+
+
+def cache_file(directory, key):
+    """
+    Function returning the file of a cache entry
+    :param directory: Cache directory
+    :param key: Content address from trace_key
+    :return: File path
+    """
+    return path.join(directory, key + cache_extension)
+
+
+def load_result(directory, key):
+    """
+    Function to read a cached result, a hit marks the entry as recently used
+    :param directory: Cache directory
+    :param key: Content address from trace_key
+    :return: Stored dictionary, None on a miss
+    """
+    file = cache_file(directory, key)
+    try:
+        with open(file, 'r') as f:
+            result = json.load(f)
+        utime(file)
+        return result
+    except (OSError, ValueError):
+        return None
+
+
+def store_result(directory, key, result, max_size):
+    """
+    Function to write a result to the cache and evict least recently used entries above max_size
+    :param directory: Cache directory
+    :param key: Content address from trace_key
+    :param result: JSON serializable dictionary
+    :param max_size: Maximum cache size in bytes
+    :return: None
+    """
+    makedirs(directory, exist_ok=True)
+    file = cache_file(directory, key)
+    temporary_file = file + '.' + str(getpid()) + '.tmp'
+    with open(temporary_file, 'w') as f:
+        json.dump(result, f)
+    replace(temporary_file, file)
+    evict(directory, max_size)
+
+
+def evict(directory, max_size):
+    """
+    Function deleting the least recently used cache entries until the cache fits max_size
+    :param directory: Cache directory
+    :param max_size: Maximum cache size in bytes
+    :return: Number of deleted entries
+    """
+    entries = []
+    for name in listdir(directory):
+        if name.endswith(cache_extension):
+            file = path.join(directory, name)
+            try:
+                entries.append((path.getmtime(file), path.getsize(file), file))
+            except OSError:
+                pass
+    total_size = sum(entry[1] for entry in entries)
+    deleted = 0
+    for modified, size, file in sorted(entries):
+        if total_size <= max_size:
+            break
+        try:
+            remove(file)
+        except OSError:
+            continue
+        total_size -= size
+        deleted += 1
+    return deleted
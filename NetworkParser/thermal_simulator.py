@@ -0,0 +1,272 @@
+# !/usr/bin/env python3
+# coding: utf-8
+__author__ = "Shushanth Prabhu"
+__email__ = "shushanth@gmail.com"
+__version__ = "1.0"
+
+# TEMPERATURE RESPONSE OF FITTED NETWORKS TO SAMPLED POWER PROFILES
+# POWER IS HELD CONSTANT OVER EACH TIME STEP (ZERO ORDER HOLD), temperature[k] IS THE TEMPERATURE AT THE END OF
+# THE STEP OF power[k], A UNIT POWER STEP THEREFORE GIVES temperature[k] = Zth((k + 1) * dt)
+
+from NetworkParser import foster_solver
+from NetworkParser import cauer_solver
+from NetworkParser import trace_tools
+from NetworkParser import FC_Error_list
+from scipy.signal import lfilter
+from numpy import asarray, zeros, empty, exp, expm1, float64, column_stack, savetxt, diff, sqrt, abs as np_abs
+from numpy.linalg import eigh
+import csv
+
+# ROWS PER CHUNK WHEN A POWER PROFILE IS STREAMED FROM A FILE
+simulation_chunk_size = 65536
+
+
+def check_time_step(dt):
+    """
+    Function to validate the time step of a simulation
+    :param dt: Time step in s
+    :return: Time step as float
+    """
+    dt = float(dt)
+    if not dt > 0:
+        raise FC_Error_list.FosterCauer_Error("Time step must be positive")
+    return dt
+
+
+def foster_step_coefficients(foster_network, dt):
+    """
+    Function returning the exact per pole update of a Foster network for one time step
+    x_i[k] = decay_i * x_i[k - 1] + gain_i * power[k]
+    :param foster_network: RC tuple with R Value First and C Value Seconds
+    :param dt: Time step in s
+    :return: Arrays decay exp(-dt / tau) and gain R (1 - exp(-dt / tau))
+    """
+    r_values, tau = foster_solver.split_foster_tuple(foster_network)
+    if (tau <= 0).any():
+        raise FC_Error_list.FosterCauer_Error("Foster time constants must be positive")
+    ratio = check_time_step(dt) / tau
+    return exp(-ratio), -r_values * expm1(-ratio)
+
+
+def simulate_foster_chunk(decay, gain, power, state):
+    """
+    Function advancing the pole temperatures of a Foster network over one chunk of power samples
+    :param decay: Decay per step from foster_step_coefficients
+    :param gain: Gain per step from foster_step_coefficients
+    :param power: Power samples in W
+    :param state: Pole temperatures before the chunk, updated in place
+    :return: Temperature rise per sample
+    """
+    power = asarray(power, dtype=float64)
+    temperature = zeros(power.shape)
+    if not len(power):
+        return temperature
+    # ONE FIRST ORDER RECURSION PER POLE, O(SAMPLES * POLES)
+    for index in range(len(decay)):
+        pole_temperature = lfilter([gain[index]], [1.0, -decay[index]], power,
+                                   zi=[decay[index] * state[index]])[0]
+        state[index] = pole_temperature[-1]
+        temperature += pole_temperature
+    return temperature
+
+
+def iter_simulate_foster(foster_network, power_chunks, dt, ambient=0.0, state=None):
+    """
+    Function simulating a Foster network on a power profile given in chunks
+    :param foster_network: RC tuple with R Value First and C Value Seconds
+    :param power_chunks: Iterable of power sample arrays in W
+    :param dt: Time step in s
+    :param ambient: Ambient temperature added to the output
+    :param state: Initial pole temperatures, zero if None, updated in place when given as a float64 array
+    :return: Generator of temperature arrays, one per chunk
+    """
+    decay, gain = foster_step_coefficients(foster_network, dt)
+    if state is None:
+        state = zeros(len(decay))
+    elif len(state) != len(decay):
+        raise FC_Error_list.FosterCauer_Error("State must have one value per RC pair")
+    for power in power_chunks:
+        yield simulate_foster_chunk(decay, gain, power, state) + ambient
+
+
+def simulate_foster(foster_network, power, dt, ambient=0.0, state=None, return_state=False):
+    """
+    Function simulating the temperature of a Foster network for a sampled power profile
+    :param foster_network: RC tuple with R Value First and C Value Seconds
+    :param power: Power samples in W
+    :param dt: Time step in s
+    :param ambient: Ambient temperature added to the output
+    :param state: Initial pole temperatures, zero if None
+    :param return_state: Also return the pole temperatures after the last sample
+    :return: Temperature per sample
+    """
+    state = zeros(len(foster_network) // 2) if state is None else asarray(state, dtype=float64).copy()
+    temperature = next(iter_simulate_foster(foster_network, [power], dt, ambient, state))
+    if return_state:
+        return temperature, state
+    return temperature
+
+
+def cauer_modes(cauer_network):
+    """
+    Function returning the modes of a Cauer ladder, the ladder is C dT/dt = -G T + P e1 with the node temperatures
+    T above ambient, the last R connects to ambient
+    :param cauer_network: Cauer network list with C Value First and R Value Seconds
+    :return: Mode rates 1 / tau, eigenvectors of the symmetric state matrix (one mode per column) and the node
+             capacitances
+    """
+    cauer_network = asarray(cauer_network, dtype=float64)
+    if len(cauer_network) < 2 or len(cauer_network) % 2 or (cauer_network <= 0).any():
+        raise FC_Error_list.FosterCauer_Error("Cauer network must contain positive C and R pairs")
+    state_matrix, cauer_c = cauer_solver.cauer_state_matrix(cauer_network)
+    rates, eigenvectors = eigh(state_matrix[0])
+    return rates, eigenvectors, cauer_c[0]
+
+
+def cauer_step_coefficients(cauer_network, dt):
+    """
+    Function returning the exact discretization of a Cauer ladder for one time step, the matrix exponential is
+    applied in the modal coordinates z of the ladder, which decouples it into first order recursions
+    z_m[k] = decay_m * z_m[k - 1] + gain_m * power[k] and T = output_matrix z
+    :param cauer_network: Cauer network list with C Value First and R Value Seconds
+    :param dt: Time step in s
+    :return: Arrays decay, gain, output matrix (nodes x modes) and input matrix (modes x nodes, z = input_matrix T)
+    """
+    rates, eigenvectors, cauer_c = cauer_modes(cauer_network)
+    ratio = check_time_step(dt) * rates
+    # (1 - exp(-rate dt)) / rate STAYS EXACT FOR STIFF MODES (rate dt >> 1) AND SLOW MODES (rate dt << 1)
+    gain = eigenvectors[0] / sqrt(cauer_c[0]) * (-expm1(-ratio) / rates)
+    output_matrix = eigenvectors / sqrt(cauer_c)[:, None]
+    input_matrix = eigenvectors.T * sqrt(cauer_c)[None, :]
+    return exp(-ratio), gain, output_matrix, input_matrix
+
+
+def simulate_cauer_chunk(decay, gain, output_matrix, power, state, nodes=None):
+    """
+    Function advancing the modal state of a Cauer ladder over one chunk of power samples
+    :param decay: Decay per step from cauer_step_coefficients
+    :param gain: Gain per step from cauer_step_coefficients
+    :param output_matrix: Output matrix from cauer_step_coefficients
+    :param power: Power samples in W
+    :param state: Modal state before the chunk, updated in place
+    :param nodes: Node indexes to return, the junction (node 0) only if None
+    :return: Junction temperature rise per sample, or array with one column per node of nodes
+    """
+    power = asarray(power, dtype=float64)
+    modes = empty((len(power), len(decay)))
+    if len(power):
+        for index in range(len(decay)):
+            modes[:, index] = lfilter([gain[index]], [1.0, -decay[index]], power,
+                                      zi=[decay[index] * state[index]])[0]
+            state[index] = modes[-1, index]
+    if nodes is None:
+        return modes @ output_matrix[0]
+    return modes @ output_matrix[list(nodes)].T
+
+
+def cauer_initial_state(input_matrix, temperature=None):
+    """
+    Function returning the modal state of a Cauer ladder from node temperatures
+    :param input_matrix: Input matrix from cauer_step_coefficients
+    :param temperature: Node temperature rises above ambient, zero if None
+    :return: Modal state
+    """
+    if temperature is None:
+        return zeros(len(input_matrix))
+    if len(temperature) != len(input_matrix):
+        raise FC_Error_list.FosterCauer_Error("Temperature must have one value per node")
+    return input_matrix @ asarray(temperature, dtype=float64)
+
+
+def iter_simulate_cauer(cauer_network, power_chunks, dt, ambient=0.0, nodes=None, temperature=None):
+    """
+    Function simulating a Cauer ladder on a power profile given in chunks
+    :param cauer_network: Cauer network list with C Value First and R Value Seconds
+    :param power_chunks: Iterable of power sample arrays in W
+    :param dt: Time step in s
+    :param ambient: Ambient temperature added to the output
+    :param nodes: Node indexes to return, the junction (node 0) only if None
+    :param temperature: Initial node temperature rises above ambient, zero if None
+    :return: Generator of temperature arrays, one per chunk (see simulate_cauer_chunk)
+    """
+    decay, gain, output_matrix, input_matrix = cauer_step_coefficients(cauer_network, dt)
+    state = cauer_initial_state(input_matrix, temperature)
+    for power in power_chunks:
+        yield simulate_cauer_chunk(decay, gain, output_matrix, power, state, nodes) + ambient
+
+
+def simulate_cauer(cauer_network, power, dt, ambient=0.0, nodes=None, temperature=None, return_state=False):
+    """
+    Function simulating the temperatures of a Cauer ladder for a sampled power profile
+    :param cauer_network: Cauer network list with C Value First and R Value Seconds
+    :param power: Power samples in W
+    :param dt: Time step in s
+    :param ambient: Ambient temperature added to the output
+    :param nodes: Node indexes to return, the junction (node 0) only if None
+    :param temperature: Initial node temperature rises above ambient, zero if None
+    :param return_state: Also return the node temperature rises after the last sample, to continue the simulation
+    :return: Junction temperature per sample, or array with one column per node of nodes
+    """
+    decay, gain, output_matrix, input_matrix = cauer_step_coefficients(cauer_network, dt)
+    state = cauer_initial_state(input_matrix, temperature)
+    output = simulate_cauer_chunk(decay, gain, output_matrix, power, state, nodes) + ambient
+    if return_state:
+        return output, output_matrix @ state
+    return output
+
+
+def iter_power_file(file, chunk_size=simulation_chunk_size, dt=None):
+    """
+    Function reading a power profile file with time in the first and power in the second column in chunks
+    :param file: CSV or text file
+    :param chunk_size: Rows per chunk
+    :param dt: Time step in s, taken from the first two samples if None
+    :return: Time step and generator of (time, power) chunks
+    """
+    chunks = trace_tools.iter_trace_chunks(file, chunk_size)
+    first = next(chunks, None)
+    if first is None or first.shape[1] < 2:
+        raise FC_Error_list.FosterCauer_Error("Input file not organized correctly, Refer documentation")
+    if dt is None:
+        if len(first) < 2:
+            raise FC_Error_list.FosterCauer_Error("Time step cannot be taken from a single sample")
+        dt = first[1, 0] - first[0, 0]
+    dt = check_time_step(dt)
+
+    def uniform_chunks():
+        previous_time = first[0, 0] - dt
+        chunk = first
+        while chunk is not None:
+            steps = diff(chunk[:, 0], prepend=previous_time)
+            if (np_abs(steps - dt) > 1e-6 * dt + 1e-12 * np_abs(chunk[:, 0])).any():
+                raise FC_Error_list.FosterCauer_Error("Power profile must be sampled with a constant time step")
+            previous_time = chunk[-1, 0]
+            yield chunk[:, 0], chunk[:, 1]
+            chunk = next(chunks, None)
+
+    return dt, uniform_chunks()
+
+
+def simulate_foster_file(foster_network, file, output, dt=None, ambient=0.0, chunk_size=simulation_chunk_size):
+    """
+    Function simulating a Foster network on a power profile file without loading the file in memory
+    :param foster_network: RC tuple with R Value First and C Value Seconds
+    :param file: Power profile file with time in the first and power in the second column
+    :param output: CSV file with time and temperature columns
+    :param dt: Time step in s, taken from the file if None
+    :param ambient: Ambient temperature added to the output
+    :param chunk_size: Rows per chunk
+    :return: Number of simulated samples
+    """
+    dt, chunks = iter_power_file(file, chunk_size, dt)
+    decay, gain = foster_step_coefficients(foster_network, dt)
+    state = zeros(len(decay))
+    count = 0
+    with open(output, 'w', newline='') as f:
+        csv.writer(f).writerow(["Time", "Temperature"])
+        for time, power in chunks:
+            temperature = simulate_foster_chunk(decay, gain, power, state) + ambient
+            # TEMPERATURE IS REPORTED AT THE END OF EACH STEP
+            savetxt(f, column_stack((time + dt, temperature)), delimiter=',', fmt='%.12g')
+            count += len(power)
+    return count
@@ -0,0 +1,165 @@
+# !/usr/bin/env python3
+# coding: utf-8
+__author__ = "Shushanth Prabhu"
+__email__ = "shushanth@gmail.com"
+__version__ = "1.0"
+
+# NETWORK IDENTIFICATION BY DECONVOLUTION (NID)
+# IN LOGARITHMIC TIME z = ln t THE DERIVATIVE OF Zth IS THE TIME CONSTANT SPECTRUM R(zeta), zeta = ln tau,
+# CONVOLVED WITH w(z) = exp(z - exp(z)), da/dz = R (x) w. THE SPECTRUM IS RECOVERED BY BAYESIAN (RICHARDSON LUCY)
+# ITERATIONS, WHICH KEEP IT POSITIVE AND ACT AS THE REGULARIZATION AGAINST NOISE.
+
+from NetworkParser import FC_Error_list
+from scipy.signal import find_peaks
+from numpy import asarray, log, exp, arange, interp, diff, clip, full, flatnonzero, column_stack, concatenate
+from numpy import argsort, argmin, savetxt, errstate
+import csv
+
+# DEFAULT RESOLUTION AND ITERATION COUNT OF THE DECONVOLUTION
+spectrum_points_per_decade = 50
+spectrum_iterations = 2000
+# PEAKS BELOW THIS FRACTION OF THE LARGEST PEAK ARE IGNORED
+spectrum_peak_threshold = 0.02
+# PEAKS WITH AN AREA BELOW THIS FRACTION OF THE TOTAL R OF ALL PEAKS ARE IGNORED
+spectrum_area_threshold = 0.02
+
+
+def log_time_slopes(time, zth, points_per_decade=spectrum_points_per_decade):
+    """
+    Function returning the slopes of Zth over logarithmic time, da/dz averaged over intervals of z = ln t
+    Samples further apart than one grid step (the start of a uniformly sampled trace, ln 2 between the first two
+    samples) are kept as their own intervals, interpolating them on the grid would give a flat derivative which
+    deconvolves into a false time constant at the start of the trace. Denser samples are interpolated on a uniform
+    ln t grid.
+    :param time: time in seconds
+    :param zth: zth
+    :param points_per_decade: Grid points per decade of time
+    :return: Arrays of interval starts and stops in ln t, and the slope of Zth over each interval
+    """
+    time = asarray(time, dtype=float)
+    zth = asarray(zth, dtype=float)
+    positive = time > 0
+    if positive.sum() < 3:
+        raise FC_Error_list.FosterCauer_Error("Time trace has too few positive values")
+    log_time = log(time[positive])
+    positive_zth = zth[positive]
+    step = log(10) / points_per_decade
+    dense = flatnonzero(diff(log_time) <= step)
+    first = dense[0] if len(dense) else len(log_time) - 1
+    grid = arange(log_time[first], log_time[-1] + step / 2, step)
+    nodes = concatenate((log_time[:first], grid))
+    values = concatenate((positive_zth[:first], interp(grid, log_time, positive_zth)))
+    if len(nodes) < 4:
+        raise FC_Error_list.FosterCauer_Error("Time trace is too short for a time constant spectrum")
+    return nodes[:-1], nodes[1:], diff(values) / diff(nodes)
+
+
+def deconvolution_kernel(start, stop, zeta):
+    """
+    Function returning the NID weight matrix, w(z - zeta) dzeta averaged over each interval of z. The integral of
+    w(x) = exp(x - exp(x)) is -exp(-exp(x)), so the average is exact for any interval length.
+    :param start: Interval starts in ln t
+    :param stop: Interval stops in ln t
+    :param zeta: Logarithmic time constant grid (uniform)
+    :return: Matrix with one row per interval and one column per zeta
+    """
+    with errstate(over='ignore'):
+        upper = -exp(-exp(stop[:, None] - zeta[None, :]))
+        lower = -exp(-exp(start[:, None] - zeta[None, :]))
+    return (upper - lower) / (stop - start)[:, None] * (zeta[1] - zeta[0])
+
+
+def bayesian_deconvolution(kernel, derivative, iterations=spectrum_iterations):
+    """
+    Function solving kernel @ spectrum = derivative for a positive spectrum by Bayesian iterations
+    :param kernel: Matrix from deconvolution_kernel
+    :param derivative: Slopes of Zth over log time (see log_time_slopes), negative values are clipped
+    :param iterations: Number of iterations
+    :return: Spectrum
+    """
+    derivative = clip(derivative, 0, None)
+    normalization = kernel.sum(axis=0)
+    normalization[normalization == 0] = 1
+    spectrum = full(kernel.shape[1], derivative.sum() / max(normalization.sum(), 1e-300))
+    for i in range(iterations):
+        estimate = kernel @ spectrum
+        ratio = derivative / clip(estimate, 1e-300, None)
+        spectrum = spectrum * (kernel.T @ ratio) / normalization
+    return spectrum
+
+
+def time_constant_spectrum(time, zth, points_per_decade=spectrum_points_per_decade,
+                           iterations=spectrum_iterations):
+    """
+    Function returning the time constant spectrum of a Zth trace
+    :param time: time in seconds
+    :param zth: zth
+    :param points_per_decade: Grid points per decade of time and time constant
+    :param iterations: Deconvolution iterations
+    :return: Arrays tau in s and spectrum R(zeta) in K/W per unit ln tau, the sum of spectrum * dzeta is the
+             thermal resistance seen within the trace
+    """
+    start, stop, slopes = log_time_slopes(time, zth, points_per_decade)
+    step = log(10) / points_per_decade
+    zeta = arange(start[0], stop[-1] + step / 2, step)
+    spectrum = bayesian_deconvolution(deconvolution_kernel(start, stop, zeta), slopes, iterations)
+    return exp(zeta), spectrum
+
+
+def spectrum_peaks(tau, spectrum, threshold=spectrum_peak_threshold, max_count=None, max_tau=None,
+                   area_threshold=spectrum_area_threshold):
+    """
+    Function turning the peaks of a time constant spectrum into Foster RC pairs
+    Each peak gives one time constant, its R is the spectrum area between the neighbouring minima
+    Zth still rising at the end of a trace deconvolves into a false peak at the last sample time, peaks at or past
+    max_tau are dropped before the areas are taken so their area goes to the neighbouring peak.
+    :param tau: Time constants from time_constant_spectrum
+    :param spectrum: Spectrum from time_constant_spectrum
+    :param threshold: Peaks below this fraction of the largest peak are ignored
+    :param max_count: Keep the largest peaks only, all if None
+    :param max_tau: Last sample time of the trace in s, peaks at or past it are ignored, all kept if None
+    :param area_threshold: Peaks with an R below this fraction of the total R of all peaks are ignored
+    :return: Foster RC tuple with R Value First and C Value Seconds, sorted by time constant
+    """
+    tau = asarray(tau, dtype=float)
+    spectrum = asarray(spectrum, dtype=float)
+    if not spectrum.max() > 0:
+        raise FC_Error_list.FosterCauer_Error("Time constant spectrum is empty")
+    step = log(tau[1] / tau[0])
+    # PAD SO PEAKS AT THE EDGES OF THE GRID ARE FOUND
+    padded = concatenate(([0.0], spectrum, [0.0]))
+    peaks = find_peaks(padded, height=threshold * spectrum.max())[0] - 1
+    if max_tau is not None:
+        peaks = peaks[tau[peaks] < max_tau]
+    if not len(peaks):
+        raise FC_Error_list.FosterCauer_Error("Time constant spectrum has no peak within the trace")
+
+    r_values = []
+    for i, peak in enumerate(peaks):
+        start = 0 if i == 0 else peaks[i - 1] + argmin(spectrum[peaks[i - 1]:peak + 1])
+        stop = len(spectrum) if i == len(peaks) - 1 else peak + argmin(spectrum[peak:peaks[i + 1] + 1])
+        r_values.append(spectrum[start:stop].sum() * step)
+    r_values = asarray(r_values)
+    keep = r_values >= area_threshold * r_values.sum()
+    peaks = peaks[keep]
+    r_values = r_values[keep]
+
+    if max_count is not None and len(peaks) > max_count:
+        keep = flatnonzero(argsort(argsort(-r_values)) < max_count)
+        peaks = peaks[keep]
+        r_values = r_values[keep]
+    return column_stack((r_values, tau[peaks] / r_values)).ravel()
+
+
+def write_spectrum(tau, spectrum, file):
+    """
+    Function to write a time constant spectrum to a CSV file
+    :param tau: Time constants in s
+    :param spectrum: Spectrum in K/W per unit ln tau
+    :param file: CSV file path
+    :return: File path
+    """
+    with open(file, 'w', newline='') as f:
+        csv.writer(f).writerow(["Tau", "Spectrum"])
+        savetxt(f, column_stack((tau, spectrum)), delimiter=',', fmt='%.12g')
+    return file
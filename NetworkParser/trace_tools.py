@@ -0,0 +1,317 @@
+# !/usr/bin/env python3
+# coding: utf-8
+__author__ = "Shushanth Prabhu"
+__email__ = "shushanth@gmail.com"
+__version__ = "1.0"
+
+from NetworkParser import FC_Error_list
+from numpy import loadtxt, load, save, ascontiguousarray, asarray, float64, int64
+from numpy import log10, floor, bincount, concatenate
+from itertools import islice
+from time import monotonic, sleep
+from os import path
+
+# DELIMITERS TRIED IN ORDER, None IS WHITESPACE
+csv_delimiters = (',', ';', '\t', None)
+# NUMBER OF LINES READ TO DETECT HEADER AND DELIMITER
+detect_line_count = 64
+
+
+def parse_float_tokens(tokens):
+    """
+    Function returning the positions of the numeric tokens of a line
+    :param tokens: Split line
+    :return: List of column positions, None if a non empty token is not numeric
+    """
+    columns = []
+    for position, token in enumerate(tokens):
+        token = token.strip()
+        if not token:
+            continue
+        try:
+            float(token)
+        except ValueError:
+            return None
+        columns.append(position)
+    return columns
+
+
+def detect_lines_layout(lines):
+    """
+    Function detecting the header rows, delimiter and numeric columns from the first lines of a trace
+    :param lines: Iterable of text lines
+    :return: Tuple (header row count, delimiter, numeric columns)
+    """
+    for row, line in enumerate(lines):
+        if row >= detect_line_count:
+            break
+        if not line.strip():
+            continue
+        for delimiter in csv_delimiters:
+            if delimiter is not None and delimiter not in line:
+                continue
+            columns = parse_float_tokens(line.split(delimiter))
+            if columns:
+                return row, delimiter, columns
+    raise FC_Error_list.FosterCauer_Error("No Data in Input File")
+
+
+def detect_csv_layout(file):
+    """
+    Function detecting the header rows, delimiter and numeric columns of a trace file
+    :param file: Text file
+    :return: Tuple (header row count, delimiter, numeric columns)
+    """
+    with open(file, 'r') as input_file:
+        return detect_lines_layout(input_file)
+
+
+def sidecar_filename(file):
+    """
+    Function returning the binary sidecar file of a trace file
+    :param file: Text file
+    :return: .npy file path
+    """
+    return file + '.npy'
+
+
+def load_trace(file, sidecar=False):
+    """
+    Function to read a trace file in bulk
+    :param file: CSV or text file, header rows and the delimiter are detected
+    :param sidecar: Save a .npy copy next to the file and memory map it on later loads
+    :return: Contiguous float64 array with one row per sample
+    """
+    if not path.exists(file):
+        raise FC_Error_list.FosterCauer_Error("File not found")
+
+    npy_file = sidecar_filename(file)
+    if sidecar and path.exists(npy_file) and path.getmtime(npy_file) >= path.getmtime(file):
+        return load(npy_file, mmap_mode='r')
+
+    header_rows, delimiter, columns = detect_csv_layout(file)
+    try:
+        trace = loadtxt(file, dtype=float64, delimiter=delimiter, skiprows=header_rows, usecols=columns,
+                        ndmin=2)
+    except ValueError:
+        raise FC_Error_list.FosterCauer_Error("Input file not organized correctly, Refer documentation")
+    trace = ascontiguousarray(trace)
+
+    if sidecar:
+        save(npy_file, trace)
+    return trace
+
+
+def load_trace_text(text):
+    """
+    Function to read a trace from text in bulk, header rows and the delimiter are detected
+    :param text: Trace as a string (for example read from stdin)
+    :return: Contiguous float64 array with one row per sample
+    """
+    lines = text.splitlines()
+    header_rows, delimiter, columns = detect_lines_layout(lines)
+    try:
+        trace = loadtxt(lines[header_rows:], dtype=float64, delimiter=delimiter, usecols=columns, ndmin=2)
+    except ValueError:
+        raise FC_Error_list.FosterCauer_Error("Input file not organized correctly, Refer documentation")
+    return ascontiguousarray(trace)
+
+
+def iter_trace_chunks(file, chunk_size=65536):
+    """
+    Function to read a trace file in chunks of rows, only one chunk is held in memory
+    :param file: CSV or text file, header rows and the delimiter are detected
+    :param chunk_size: Maximum number of rows per chunk
+    :return: Generator of contiguous float64 arrays with one row per sample
+    """
+    if not path.exists(file):
+        raise FC_Error_list.FosterCauer_Error("File not found")
+
+    header_rows, delimiter, columns = detect_csv_layout(file)
+    with open(file, 'r') as input_file:
+        for line in islice(input_file, header_rows):
+            pass
+        while True:
+            lines = list(islice(input_file, chunk_size))
+            if not lines:
+                break
+            try:
+                chunk = loadtxt(lines, dtype=float64, delimiter=delimiter, usecols=columns, ndmin=2)
+            except ValueError:
+                raise FC_Error_list.FosterCauer_Error("Input file not organized correctly, Refer documentation")
+            if len(chunk):
+                yield ascontiguousarray(chunk)
+
+
+def load_trace_columns(file, zth_dtype=float64, chunk_size=65536):
+    """
+    Function to read the time and Zth columns of a trace file chunk by chunk, so no float64 copy of the whole file
+    is made when Zth is kept in a smaller type
+    :param file: CSV or text file, header rows and the delimiter are detected
+    :param zth_dtype: Type of the Zth array, time is always float64
+    :param chunk_size: Rows per chunk
+    :return: Time and Zth arrays
+    """
+    time_chunks = []
+    zth_chunks = []
+    for chunk in iter_trace_chunks(file, chunk_size):
+        if chunk.shape[1] < 2:
+            raise FC_Error_list.FosterCauer_Error("Input file not organized correctly, Refer documentation")
+        time_chunks.append(chunk[:, 0].copy())
+        zth_chunks.append(chunk[:, 1].astype(zth_dtype))
+    if not time_chunks:
+        raise FC_Error_list.FosterCauer_Error("No Data in Input File")
+    return concatenate(time_chunks), concatenate(zth_chunks)
+
+
+def tail_trace_file(file, poll_interval=1.0, idle_timeout=None, chunk_size=65536):
+    """
+    Function following a trace file which is still being written, like tail -f
+    Header rows and the delimiter are detected once the first numeric line arrived, an unfinished last line is kept
+    until its line end is written.
+    :param file: CSV or text file
+    :param poll_interval: Seconds to wait when no new data was written
+    :param idle_timeout: Stop after this many seconds without new data, follow forever if None
+    :param chunk_size: Maximum number of rows per chunk
+    :return: Generator of contiguous float64 arrays with one row per new sample
+    """
+    if not path.exists(file):
+        raise FC_Error_list.FosterCauer_Error("File not found")
+
+    layout = None
+    pending = ''
+    header_lines = []
+    idle_since = monotonic()
+    with open(file, 'r') as input_file:
+        while True:
+            data = input_file.read()
+            if data:
+                idle_since = monotonic()
+                lines = (pending + data).split('\n')
+                pending = lines.pop()
+            elif idle_timeout is not None and monotonic() - idle_since > idle_timeout:
+                # THE WRITER STOPPED, AN UNTERMINATED LAST LINE IS COMPLETE
+                lines = [pending] if pending.strip() else []
+                pending = ''
+            else:
+                sleep(poll_interval)
+                continue
+
+            if layout is None:
+                header_lines.extend(lines)
+                try:
+                    layout = detect_lines_layout(header_lines)
+                except FC_Error_list.FosterCauer_Error:
+                    if len(header_lines) >= detect_line_count:
+                        raise
+                    lines = []
+                else:
+                    lines = header_lines[layout[0]:]
+            lines = [line for line in lines if line.strip()]
+            for start in range(0, len(lines), chunk_size):
+                try:
+                    chunk = loadtxt(lines[start:start + chunk_size], dtype=float64, delimiter=layout[1],
+                                    usecols=layout[2], ndmin=2)
+                except ValueError:
+                    raise FC_Error_list.FosterCauer_Error("Input file not organized correctly, Refer documentation")
+                yield ascontiguousarray(chunk)
+
+            if not data:
+                return
+
+
+def estimate_line_count(file, sample_size=65536):
+    """
+    Function estimating the number of lines of a file from its size and the first lines
+    :param file: Text file
+    :param sample_size: Number of bytes used for the estimate
+    :return: Estimated number of lines
+    """
+    file_size = path.getsize(file)
+    with open(file, 'rb') as input_file:
+        sample = input_file.read(sample_size)
+    line_count = sample.count(b'\n')
+    if not line_count or len(sample) >= file_size:
+        return max(line_count, 1)
+    return int(file_size * line_count / len(sample)) + 1
+
+
+def reduce_trace_file(file, output=None, grid='stride', max_samples=1048576, points_per_decade=50):
+    """
+    Function reducing a large trace file in a single streaming pass.
+    Header rows and the first sample are always kept.
+    :param file: CSV or text file
+    :param output: File path for the reduced trace, the reduced trace is returned as an array if None
+    :param grid: stride keeps every k-th sample for about max_samples samples,
+                 log keeps at most points_per_decade samples per decade of time
+    :param max_samples: Target number of samples of the stride grid
+    :param points_per_decade: Samples per decade of the log grid
+    :return: Output file path, or float64 array with one row per kept sample
+    """
+    if not path.exists(file):
+        raise FC_Error_list.FosterCauer_Error("File not found")
+    if grid not in ('stride', 'log'):
+        raise FC_Error_list.FosterCauer_Error("Unknown reduction grid " + str(grid))
+
+    header_rows, delimiter, columns = detect_csv_layout(file)
+    factor = 1 + estimate_line_count(file) // max_samples
+    log_step = 10 ** (1 / points_per_decade)
+    next_time = None
+    kept_rows = []
+    output_file = open(output, 'w') if output is not None else None
+    try:
+        with open(file, 'r') as input_file:
+            for row, line in enumerate(input_file):
+                if row < header_rows:
+                    if output_file is not None:
+                        output_file.write(line)
+                    continue
+                if not line.strip():
+                    continue
+                sample = row - header_rows
+                if grid == 'stride':
+                    keep = sample % factor == 0
+                else:
+                    time_value = float(line.split(delimiter)[columns[0]])
+                    keep = next_time is None or time_value >= next_time
+                    if keep:
+                        next_time = time_value * log_step if time_value > 0 else 0.0
+                if not keep:
+                    continue
+                if output_file is not None:
+                    output_file.write(line)
+                else:
+                    tokens = line.split(delimiter)
+                    kept_rows.append([float(tokens[i]) for i in columns])
+    except (ValueError, IndexError):
+        raise FC_Error_list.FosterCauer_Error("Input file not organized correctly, Refer documentation")
+    finally:
+        if output_file is not None:
+            output_file.close()
+
+    if output is not None:
+        return output
+    return ascontiguousarray(asarray(kept_rows, dtype=float64).reshape(-1, len(columns)))
+
+
+def resample_log_time(time, zth, points_per_decade=50):
+    """
+    Function bin averaging a trace onto log-spaced time bins.
+    Samples at time zero or before are kept as they are.
+    :param time: time in seconds
+    :param zth: zth
+    :param points_per_decade: Number of bins per decade of time
+    :return: Resampled time and Zth arrays
+    """
+    time = asarray(time, dtype=float64)
+    zth = asarray(zth, dtype=float64)
+    positive = time > 0
+    if not positive.any():
+        return time, zth
+    log_time = log10(time[positive])
+    bins = floor((log_time - log_time.min()) * points_per_decade).astype(int64)
+    counts = bincount(bins)
+    filled = counts > 0
+    bin_time = bincount(bins, weights=time[positive])[filled] / counts[filled]
+    bin_zth = bincount(bins, weights=zth[positive])[filled] / counts[filled]
+    return concatenate((time[~positive], bin_time)), concatenate((zth[~positive], bin_zth))
@@ -0,0 +1,209 @@
+# !/usr/bin/env python3
+# coding: utf-8
+__author__ = "Shushanth Prabhu"
+__email__ = "shushanth@gmail.com"
+__version__ = "1.0"
+
+# BENCHMARK OF THE SOLVER STAGES ON SYNTHETIC Zth TRACES OF KNOWN FOSTER NETWORKS
+# RUN FROM THE REPOSITORY ROOT: python -m benchmarks.zth_benchmark --help
+
+from NetworkParser import foster_solver
+from NetworkParser import cauer_solver
+from argparse import ArgumentParser
+from tempfile import TemporaryDirectory
+from time import perf_counter, strftime
+from os import path
+import tracemalloc
+import platform
+import json
+import numpy as np
+import scipy
+
+
+def synthetic_network(order, spread, rng, tau_min=1e-4):
+    """
+    Function returning a random Foster network
+    :param order: Number of RC pairs
+    :param spread: Decades between the smallest and largest time constant
+    :param rng: numpy Generator
+    :param tau_min: Smallest time constant in s
+    :return: Foster RC tuple with R Value First and C Value Seconds, sorted by time constant
+    """
+    tau = np.sort(tau_min * 10 ** rng.uniform(0, spread, order))
+    r_values = rng.uniform(0.1, 2.0, order)
+    return np.column_stack((r_values, tau / r_values)).ravel()
+
+
+def synthetic_zth(network, samples, noise, rng):
+    """
+    Function returning a uniformly sampled Zth trace of a Foster network
+    :param network: Foster RC tuple
+    :param samples: Number of samples
+    :param noise: Standard deviation of the added noise relative to the final Zth
+    :param rng: numpy Generator
+    :return: Time and Zth arrays, Zth starts at zero
+    """
+    tau = foster_solver.split_foster_tuple(network)[1]
+    time = np.linspace(0, 5 * tau.max(), int(samples))
+    zth = foster_solver.foster_func(network, time)
+    if noise:
+        zth = zth + rng.normal(0, noise * zth[-1], zth.shape)
+        zth[0] = 0
+        zth = np.abs(zth)
+    return time, zth
+
+
+def recovery_error(network, fitted, time):
+    """
+    Function comparing a fitted network with the known network
+    :param network: Known Foster RC tuple
+    :param fitted: Fitted Foster RC tuple
+    :param time: time in seconds
+    :return: Dictionary with the maximum step response error relative to the final Zth and, for equal orders,
+             the maximum relative error of the sorted time constants and R values
+    """
+    zth = foster_solver.foster_func(network, time)
+    error = {'response_error': float(np.abs(foster_solver.foster_func(fitted, time) - zth).max() / zth[-1]),
+             'tau_error': None, 'r_error': None}
+    if len(fitted) == len(network):
+        r_true, tau_true = foster_solver.split_foster_tuple(network)
+        r_fit, tau_fit = foster_solver.split_foster_tuple(fitted)
+        order_true = np.argsort(tau_true)
+        order_fit = np.argsort(tau_fit)
+        error['tau_error'] = float(np.abs(tau_fit[order_fit] / tau_true[order_true] - 1).max())
+        error['r_error'] = float(np.abs(r_fit[order_fit] / r_true[order_true] - 1).max())
+    return error
+
+
+def measure(function, memory):
+    """
+    Function timing a call and counting its least_squares evaluations
+    :param function: Called with a progress callback
+    :param memory: Repeat the call under tracemalloc to record the peak memory
+    :return: Result of the call and a dictionary with wall time, nfev and peak memory in bytes
+    """
+    counter = {'nfev': 0}
+
+    def callback(event):
+        if event['stage'] == 'iteration':
+            counter['nfev'] += 1
+
+    start = perf_counter()
+    result = function(callback)
+    record = {'wall_time': perf_counter() - start, 'nfev': counter['nfev'], 'peak_memory': None}
+    if memory:
+        tracemalloc.start()
+        function(lambda event: None)
+        record['peak_memory'] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result, record
+
+
+def benchmark_case(order, samples, noise, spread, seed, default_tuple, memory, stages, max_elements=None):
+    """
+    Function running all stages on one synthetic trace, max_elements limits the order sweeps
+    :return: List of records, one per stage
+    """
+    rng = np.random.default_rng(seed)
+    network = synthetic_network(order, spread, rng)
+    time, zth = synthetic_zth(network, samples, noise, rng)
+    case = {'order': order, 'samples': int(samples), 'noise': noise, 'spread': spread, 'seed': seed}
+    records = []
+
+    with TemporaryDirectory() as directory:
+        if 'read_csv_file' in stages:
+            csv_file = path.join(directory, 'zth.csv')
+            np.savetxt(csv_file, np.column_stack((time, zth)), delimiter=',', header='Time,Zth', comments='')
+            trace, record = measure(lambda callback: foster_solver.read_csv_file(csv_file), memory)
+            record['max_read_error'] = float(np.abs(trace[:, 1] - zth).max())
+            records.append(dict(case, stage='read_csv_file', **record))
+
+    if 'solve_foster' in stages:
+        fitted, record = measure(lambda callback: foster_solver.solve_foster(time, zth, order, default_tuple,
+                                                                             callback=callback), memory)
+        records.append(dict(case, stage='solve_foster', **record, **recovery_error(network, fitted, time)))
+
+    fitted = None
+    if 'create_foster_network' in stages:
+        fitted, record = measure(lambda callback: foster_solver.create_foster_network(time, zth, default_tuple,
+                                                                                      max_elements,
+                                                                                      callback=callback), memory)
+        records.append(dict(case, stage='create_foster_network', fitted_order=len(fitted) // 2, **record,
+                            **recovery_error(network, fitted, time)))
+
+    if 'foster_to_cauer' in stages:
+        engine = foster_solver.get_default_option(default_tuple, foster_solver.cauer_engine_index,
+                                                  cauer_solver.numeric_engine)
+        cauer, record = measure(lambda callback: cauer_solver.foster_to_cauer(network, engine), memory)
+        round_trip = cauer_solver.cauer_to_foster([float(i) for i in cauer])
+        records.append(dict(case, stage='foster_to_cauer', engine=engine, **record,
+                            **recovery_error(network, round_trip, time)))
+
+    if 'solve_cauer' in stages:
+        cauer, record = measure(lambda callback: cauer_solver.solve_cauer(time, zth, default_tuple, callback,
+                                                                          max_elements=max_elements), memory)
+        records.append(dict(case, stage='solve_cauer', fitted_order=len(cauer) // 2, **record))
+    return records
+
+
+def create_parser():
+    """
+    Function creating the command line parser
+    :return: ArgumentParser
+    """
+    parser = ArgumentParser(prog='python -m benchmarks.zth_benchmark',
+                            description='Time the solver stages on synthetic Zth traces of known Foster networks.')
+    parser.add_argument('--orders', type=int, nargs='+', default=[2, 4, 8], help='Foster orders')
+    parser.add_argument('--samples', type=float, nargs='+', default=[1e3, 1e4, 1e5],
+                        help='Samples per trace (1e3 to 1e7)')
+    parser.add_argument('--noise', type=float, nargs='+', default=[0.0, 1e-3],
+                        help='Noise relative to the final Zth')
+    parser.add_argument('--spread', type=float, nargs='+', default=[4.0], help='Decades of time constants')
+    parser.add_argument('--seeds', type=int, default=1, help='Random networks per case')
+    parser.add_argument('--solver', default=foster_solver.joint_solver, help='Foster solver mode')
+    parser.add_argument('--parameterization', default=foster_solver.linear_parameterization,
+                        help='Foster optimization variables (linear or log)')
+    parser.add_argument('--max-elements', type=int, default=None, help='Maximum sweep order + 1')
+    parser.add_argument('--stages', nargs='+',
+                        default=['read_csv_file', 'solve_foster', 'create_foster_network', 'foster_to_cauer',
+                                 'solve_cauer'], help='Stages to run')
+    parser.add_argument('--no-memory', action='store_true', help='Skip the tracemalloc peak memory pass')
+    parser.add_argument('--output', default='benchmark_results.json', help='Result file (JSON)')
+    return parser
+
+
+def main(argv=None):
+    """
+    Benchmark entry point
+    :param argv: Arguments, sys.argv if None
+    :return: List of records
+    """
+    args = create_parser().parse_args(argv)
+    default_tuple = list(foster_solver.foster_default_value())
+    default_tuple[foster_solver.foster_solver_index] = args.solver
+    default_tuple[foster_solver.parameterization_index] = args.parameterization
+    default_tuple[foster_solver.cache_directory_index] = None
+    default_tuple = tuple(default_tuple)
+
+    records = []
+    for order in args.orders:
+        for samples in args.samples:
+            for noise in args.noise:
+                for spread in args.spread:
+                    for seed in range(args.seeds):
+                        for record in benchmark_case(order, samples, noise, spread, seed, default_tuple,
+                                                     not args.no_memory, args.stages, args.max_elements):
+                            print(record['stage'], record['order'], record['samples'], record['noise'],
+                                  "%.3f s" % record['wall_time'], record['nfev'])
+                            records.append(record)
+
+    output = {'created': strftime('%Y-%m-%dT%H:%M:%S'), 'solver_version': foster_solver.__version__,
+              'python': platform.python_version(), 'numpy': np.__version__, 'scipy': scipy.__version__,
+              'machine': platform.machine(), 'settings': [repr(i) for i in default_tuple], 'records': records}
+    with open(args.output, 'w') as f:
+        json.dump(output, f, indent=2)
+    return records
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+# !/usr/bin/env python3
+# coding: utf-8
+__author__ = "Shushanth Prabhu"
+__email__ = "shushanth@gmail.com"
+__version__ = "1.0"
+
+# ROUND TRIPS FOSTER -> CAUER -> FOSTER, RUN WITH python -m pytest FROM THE REPOSITORY ROOT
+
+from NetworkParser import foster_solver
+from NetworkParser import cauer_solver
+from numpy import asarray, array, linspace, argsort, allclose, float64
+import pytest
+
+foster_networks = [[1.0, 0.5],
+                   [0.5, 0.004, 1.0, 0.5, 0.3, 166.0],
+                   [0.2, 1e-4, 0.4, 0.02, 0.8, 1.5, 1.2, 40.0, 0.6, 2000.0]]
+
+
+def sorted_foster(network):
+    """
+    Function sorting a Foster network by time constant, conversions do not keep the order of the RC pairs
+    :param network: RC tuple with R Value First and C Value Seconds
+    :return: Array of (R, C) rows sorted by time constant
+    """
+    pairs = asarray(network, dtype=float64).reshape(-1, 2)
+    return pairs[argsort(pairs[:, 0] * pairs[:, 1])]
+
+
+@pytest.mark.parametrize('foster_network', foster_networks)
+@pytest.mark.parametrize('engine', [cauer_solver.numeric_engine, cauer_solver.sympy_engine])
+def test_foster_cauer_round_trip(foster_network, engine):
+    cauer_network = asarray([float(i) for i in cauer_solver.foster_to_cauer(foster_network, engine)])
+    assert len(cauer_network) == len(foster_network)
+    assert (cauer_network > 0).all()
+    assert allclose(sorted_foster(cauer_solver.cauer_to_foster(cauer_network)), sorted_foster(foster_network),
+                    rtol=1e-6)
+
+
+@pytest.mark.parametrize('foster_network', foster_networks)
+def test_engines_agree(foster_network):
+    numeric = cauer_solver.foster_to_cauer(foster_network, cauer_solver.numeric_engine)
+    symbolic = [float(i) for i in cauer_solver.foster_to_cauer(foster_network, cauer_solver.sympy_engine)]
+    assert allclose(numeric, symbolic, rtol=1e-6)
+
+
+def test_batch_round_trip():
+    networks = array([[0.5, 0.004, 1.0, 0.5, 0.3, 166.0],
+                      [1.0, 0.01, 2.0, 1.0, 0.5, 50.0],
+                      [0.1, 0.1, 0.2, 0.2, 0.3, 0.3]])
+    cauer_networks = cauer_solver.foster_to_cauer_numeric(networks)
+    assert cauer_networks.shape == networks.shape
+    for row, cauer_network in zip(networks, cauer_networks):
+        assert allclose(cauer_network, cauer_solver.foster_to_cauer(row), rtol=1e-12)
+    foster_networks_back = cauer_solver.cauer_to_foster(cauer_networks)
+    assert foster_networks_back.shape == networks.shape
+    for row, foster_network in zip(networks, foster_networks_back):
+        assert allclose(sorted_foster(foster_network), sorted_foster(row), rtol=1e-6)
+
+
+def test_solve_cauer_round_trip():
+    foster_network = [0.5, 0.004, 1.0, 0.5, 0.3, 166.0]
+    time = linspace(0, 300, 3000)
+    zth = foster_solver.foster_func(foster_network, time)
+    default_tuple = list(foster_solver.foster_default_value())
+    default_tuple[foster_solver.cache_directory_index] = None
+    cauer_network = cauer_solver.solve_cauer(time, zth, tuple(default_tuple))
+    assert allclose(foster_solver.foster_func(cauer_solver.cauer_to_foster(cauer_network), time), zth, atol=1e-6)
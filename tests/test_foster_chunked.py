@@ -0,0 +1,71 @@
+# !/usr/bin/env python3
+# coding: utf-8
+__author__ = "Shushanth Prabhu"
+__email__ = "shushanth@gmail.com"
+__version__ = "1.0"
+
+# MEMORY BOUNDED MODE, RUN WITH python -m pytest FROM THE REPOSITORY ROOT
+
+from NetworkParser import foster_solver
+from NetworkParser import FC_Error_list
+from numpy import linspace, allclose
+import tracemalloc
+import pytest
+
+foster_network = [0.5, 0.02, 1.0, 0.5, 0.3, 166.0]
+
+
+def chunked_default_tuple(chunk_size, parameterization=foster_solver.linear_parameterization):
+    """
+    Function returning the default tuple of a chunked sweep without result cache
+    :param chunk_size: Samples per chunk
+    :param parameterization: linear or log
+    :return: Default tuple
+    """
+    default_tuple = list(foster_solver.foster_default_value())
+    default_tuple[foster_solver.cache_directory_index] = None
+    default_tuple[foster_solver.chunk_size_index] = chunk_size
+    default_tuple[foster_solver.parameterization_index] = parameterization
+    return tuple(default_tuple)
+
+
+@pytest.mark.parametrize('parameterization', [foster_solver.linear_parameterization,
+                                              foster_solver.log_parameterization])
+def test_chunked_fit(parameterization):
+    time = linspace(0, 300, 20000)
+    zth = foster_solver.foster_func(foster_network, time)
+    network = foster_solver.create_foster_network(time, zth, chunked_default_tuple(4096, parameterization))
+    assert len(network) == len(foster_network)
+    assert allclose(foster_solver.foster_func(network, time), zth, atol=1e-8)
+
+
+def sweep_peak_memory(samples):
+    """
+    Function returning the peak memory allocated by a chunked sweep, the trace itself is allocated before
+    :param samples: Trace length
+    :return: Peak memory in bytes
+    """
+    time = linspace(0, 300, samples)
+    zth = foster_solver.foster_func(foster_network, time)
+    tracemalloc.start()
+    try:
+        foster_solver.create_foster_network(time, zth, chunked_default_tuple(16384), max_elements=4)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def test_chunked_memory_does_not_grow_with_trace_length():
+    short_peak = sweep_peak_memory(100000)
+    long_peak = sweep_peak_memory(1000000)
+    # A SINGLE FLOAT64 VECTOR OF THE LONG TRACE IS 8 MB
+    assert long_peak < 1.25 * short_peak + 1e6
+
+
+def test_chunked_separable_is_an_error():
+    time = linspace(0, 300, 1000)
+    zth = foster_solver.foster_func(foster_network, time)
+    default_tuple = list(chunked_default_tuple(256))
+    default_tuple[foster_solver.foster_solver_index] = foster_solver.separable_solver
+    with pytest.raises(FC_Error_list.FosterCauer_Error):
+        foster_solver.solve_foster(time, zth, 2, tuple(default_tuple))
@@ -0,0 +1,32 @@
+# !/usr/bin/env python3
+# coding: utf-8
+__author__ = "Shushanth Prabhu"
+__email__ = "shushanth@gmail.com"
+__version__ = "1.0"
+
+# ORDER SWEEP MODES, RUN WITH python -m pytest FROM THE REPOSITORY ROOT
+
+from NetworkParser import foster_solver
+from numpy import linspace
+import pytest
+
+
+def test_sweep_mode():
+    assert foster_solver.sweep_mode(1, True, 1, False) == (foster_solver.serial_sweep, 1)
+    assert foster_solver.sweep_mode(4, True, 1, False) == (foster_solver.serial_sweep, 1)
+    assert foster_solver.sweep_mode(4, False, 1, False) == (foster_solver.parallel_orders_sweep, 4)
+    assert foster_solver.sweep_mode(4, True, 3, False) == (foster_solver.parallel_starts_sweep, 4)
+    assert foster_solver.sweep_mode(4, False, 1, True) == (foster_solver.spectrum_seed_sweep, 1)
+
+
+def test_warm_started_workers_warn_and_report_serial():
+    time = linspace(0, 300, 2000)
+    zth = foster_solver.foster_func([0.5, 0.02, 1.0, 0.5], time)
+    default_tuple = list(foster_solver.foster_default_value())
+    default_tuple[foster_solver.cache_directory_index] = None
+    default_tuple[foster_solver.warm_start_index] = True
+    with pytest.warns(RuntimeWarning):
+        report = foster_solver.create_foster_network(time, zth, tuple(default_tuple), max_elements=3, workers=2,
+                                                     return_report=True)[1]
+    assert report['sweep_mode'] == foster_solver.serial_sweep
+    assert report['sweep_workers'] == 1
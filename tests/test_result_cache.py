@@ -0,0 +1,123 @@
+# !/usr/bin/env python3
+# coding: utf-8
+__author__ = "Shushanth Prabhu"
+__email__ = "shushanth@gmail.com"
+__version__ = "1.0"
+
+# RESULT CACHE, RUN WITH python -m pytest FROM THE REPOSITORY ROOT
+
+from NetworkParser import foster_solver
+from NetworkParser import cauer_solver
+from NetworkParser import result_cache
+from numpy import linspace, column_stack, savetxt, float32
+from os import utime, listdir, path
+
+
+def write_trace(file):
+    """
+    Function writing a two pole Foster trace as CSV file
+    :param file: CSV file path
+    :return: File path as string
+    """
+    time = linspace(0, 100, 2000)
+    zth = foster_solver.foster_func([0.5, 0.02, 1.0, 5.0], time)
+    savetxt(str(file), column_stack((time, zth)), delimiter=',', header='Time,Zth', comments='')
+    return str(file)
+
+
+def cached_default_tuple(directory):
+    """
+    Function returning the default tuple of a short sweep cached in directory
+    :param directory: Cache directory
+    :return: Default tuple
+    """
+    default_tuple = list(foster_solver.foster_default_value())
+    default_tuple[foster_solver.cache_directory_index] = str(directory)
+    default_tuple[foster_solver.stop_ratio_index] = 0.5
+    return tuple(default_tuple)
+
+
+def test_cauer_report_keeps_the_foster_lookup_apart(tmp_path):
+    file = write_trace(tmp_path / 'trace.csv')
+    default_tuple = cached_default_tuple(tmp_path / 'cache')
+    foster_solver.get_foster_network(file, default_tuple)
+
+    report = cauer_solver.get_cauer_network(file, default_tuple, return_report=True)[1]
+    assert report['cache'] == 'miss'
+    assert report['foster_cache'] == 'hit'
+    assert 'cauer_conversion' in report['stages']
+
+    report = cauer_solver.get_cauer_network(file, default_tuple, return_report=True)[1]
+    assert report['cache'] == 'hit'
+
+
+def trace_key(time, zth, default_tuple, version=foster_solver.foster_solver_version):
+    """
+    Function returning the Foster cache key of a trace as cached_foster_network computes it
+    :param time: time in seconds
+    :param zth: zth
+    :param default_tuple: Tuple from foster_default_value
+    :param version: Solver version
+    :return: Hex digest
+    """
+    return result_cache.trace_key('foster', (time, zth), foster_solver.cache_settings(default_tuple), version)
+
+
+def test_key_changes_with_dtype_settings_and_version():
+    time = linspace(0, 1, 100)
+    zth = foster_solver.foster_func([1.0, 0.5], time)
+    default_tuple = foster_solver.foster_default_value()
+    key = trace_key(time, zth, default_tuple)
+    assert key == trace_key(time.copy(), zth.copy(), default_tuple)
+    assert key != trace_key(time, zth.astype(float32).astype(float), default_tuple)
+    assert key != trace_key(time, zth.astype(float32), default_tuple)
+
+    changed = list(default_tuple)
+    changed[foster_solver.parameterization_index] = foster_solver.log_parameterization
+    assert key != trace_key(time, zth, tuple(changed))
+    assert key != trace_key(time, zth, default_tuple, foster_solver.foster_solver_version + 1)
+    assert key != result_cache.trace_key('cauer', (time, zth), foster_solver.cache_settings(default_tuple),
+                                         foster_solver.foster_solver_version)
+
+
+def test_key_ignores_workers_and_cache_settings():
+    time = linspace(0, 1, 100)
+    zth = foster_solver.foster_func([1.0, 0.5], time)
+    default_tuple = foster_solver.foster_default_value()
+    changed = list(default_tuple)
+    changed[foster_solver.workers_index] = 8
+    changed[foster_solver.cache_directory_index] = 'elsewhere'
+    changed[foster_solver.cache_size_index] = 1
+    assert trace_key(time, zth, default_tuple) == trace_key(time, zth, tuple(changed))
+
+
+def stored_entries(directory):
+    """
+    Function returning the keys of the entries in a cache directory
+    :param directory: Cache directory
+    :return: Sorted list of keys
+    """
+    return sorted(path.splitext(name)[0] for name in listdir(directory) if name.endswith(result_cache.cache_extension))
+
+
+def test_evicts_least_recently_used_first(tmp_path):
+    directory = str(tmp_path)
+    for age, key in enumerate(['c', 'b', 'a']):
+        result_cache.store_result(directory, key, {'network': [1.0]}, 1e9)
+        # OLDER ENTRIES GET AN EARLIER MODIFICATION TIME
+        utime(result_cache.cache_file(directory, key), (1000 - age, 1000 - age))
+    entry_size = path.getsize(result_cache.cache_file(directory, 'a'))
+
+    # A HIT MARKS THE OLDEST ENTRY AS RECENTLY USED
+    assert result_cache.load_result(directory, 'a') == {'network': [1.0]}
+    assert result_cache.evict(directory, 2 * entry_size) == 1
+    assert stored_entries(directory) == ['a', 'c']
+    assert result_cache.evict(directory, entry_size) == 1
+    assert stored_entries(directory) == ['a']
+
+
+def test_zero_size_keeps_nothing(tmp_path):
+    directory = str(tmp_path)
+    result_cache.store_result(directory, 'a', {'network': [1.0]}, 0)
+    assert stored_entries(directory) == []
+    assert result_cache.load_result(directory, 'a') is None
@@ -0,0 +1,44 @@
+# !/usr/bin/env python3
+# coding: utf-8
+__author__ = "Shushanth Prabhu"
+__email__ = "shushanth@gmail.com"
+__version__ = "1.0"
+
+# TIME CONSTANT SPECTRUM PEAKS, RUN WITH python -m pytest FROM THE REPOSITORY ROOT
+
+from NetworkParser import foster_solver
+from NetworkParser import time_constant_spectrum
+from numpy import linspace, sort, allclose
+from numpy.random import default_rng
+import pytest
+
+foster_network = [0.5, 0.02, 1.0, 0.5, 0.3, 166.0]
+
+
+def noisy_trace(seed):
+    """
+    Function returning a uniformly sampled trace of foster_network with 0.1 % noise, Zth still rises at its end
+    :param seed: Noise seed
+    :return: time and zth arrays
+    """
+    time = linspace(0, 300, 30000)
+    zth = foster_solver.foster_func(foster_network, time)
+    return time, zth + 1e-3 * zth.max() * default_rng(seed).standard_normal(len(time))
+
+
+@pytest.mark.parametrize('seed', [1, 2, 4])
+def test_no_peak_at_the_end_of_a_noisy_trace(seed):
+    time, zth = noisy_trace(seed)
+    tau, spectrum = time_constant_spectrum.time_constant_spectrum(time, zth)
+    peaks = time_constant_spectrum.spectrum_peaks(tau, spectrum, max_tau=time[-1])
+    assert len(peaks) == 6
+    assert allclose(sort(peaks[0::2] * peaks[1::2]), [0.01, 0.5, 50.0], rtol=0.2)
+
+
+def test_spectrum_seed_of_a_noisy_trace():
+    time, zth = noisy_trace(1)
+    default_tuple = list(foster_solver.foster_default_value())
+    default_tuple[foster_solver.cache_directory_index] = None
+    default_tuple[foster_solver.spectrum_seed_index] = True
+    network = foster_solver.create_foster_network(time, zth, tuple(default_tuple))
+    assert len(network) == 6
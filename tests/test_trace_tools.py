@@ -0,0 +1,70 @@
+# !/usr/bin/env python3
+# coding: utf-8
+__author__ = "Shushanth Prabhu"
+__email__ = "shushanth@gmail.com"
+__version__ = "1.0"
+
+# TRACE FILE LAYOUT DETECTION AND SIDECAR FILES, RUN WITH python -m pytest FROM THE REPOSITORY ROOT
+
+from NetworkParser import trace_tools
+from numpy import array, allclose, memmap
+from os import path, utime
+import pytest
+
+trace = array([[0.0, 0.0], [0.5, 0.25], [1.0, 0.75], [2.0, 1.25]])
+
+
+def trace_text(delimiter, header_lines=(), trailing=''):
+    """
+    Function returning the text of trace as a trace file
+    :param delimiter: Column delimiter
+    :param header_lines: Lines written before the samples
+    :param trailing: Text appended to every sample line
+    :return: File text
+    """
+    lines = list(header_lines) + [delimiter.join(repr(float(value)) for value in row) + trailing for row in trace]
+    return '\n'.join(lines) + '\n'
+
+
+@pytest.mark.parametrize('delimiter, detected', [(',', ','), (';', ';'), ('\t', '\t'), ('   ', None)])
+def test_delimiters(tmp_path, delimiter, detected):
+    file = tmp_path / 'trace.csv'
+    file.write_text(trace_text(delimiter))
+    assert trace_tools.detect_csv_layout(str(file)) == (0, detected, [0, 1])
+    assert allclose(trace_tools.load_trace(str(file)), trace)
+
+
+@pytest.mark.parametrize('delimiter', [',', ';', '\t'])
+def test_header_and_unit_rows(tmp_path, delimiter):
+    file = tmp_path / 'trace.csv'
+    file.write_text(trace_text(delimiter, ('', delimiter.join(['Time', 'Zth']), delimiter.join(['s', 'K/W']))))
+    assert trace_tools.detect_csv_layout(str(file)) == (3, delimiter, [0, 1])
+    assert allclose(trace_tools.load_trace(str(file)), trace)
+    assert allclose(trace_tools.load_trace_text(file.read_text()), trace)
+
+
+@pytest.mark.parametrize('delimiter', [',', ';'])
+def test_trailing_delimiter(tmp_path, delimiter):
+    file = tmp_path / 'trace.csv'
+    file.write_text(trace_text(delimiter, (delimiter.join(['Time', 'Zth', '']),), trailing=delimiter))
+    assert trace_tools.detect_csv_layout(str(file)) == (1, delimiter, [0, 1])
+    assert allclose(trace_tools.load_trace(str(file)), trace)
+    time, zth = trace_tools.load_trace_columns(str(file))
+    assert allclose(time, trace[:, 0]) and allclose(zth, trace[:, 1])
+
+
+def test_sidecar_is_used_and_refreshed_when_stale(tmp_path):
+    file = tmp_path / 'trace.csv'
+    file.write_text(trace_text(','))
+    loaded = trace_tools.load_trace(str(file), sidecar=True)
+    npy_file = trace_tools.sidecar_filename(str(file))
+    assert path.exists(npy_file) and allclose(loaded, trace)
+    assert isinstance(trace_tools.load_trace(str(file), sidecar=True), memmap)
+
+    # A NEWER CSV FILE NEXT TO THE OLD SIDECAR
+    changed = trace * 2
+    file.write_text('\n'.join(','.join(repr(float(value)) for value in row) for row in changed) + '\n')
+    utime(npy_file, (1000, 1000))
+    assert allclose(trace_tools.load_trace(str(file), sidecar=True), changed)
+    assert path.getmtime(npy_file) >= path.getmtime(str(file))
+    assert allclose(trace_tools.load_trace(str(file), sidecar=True), changed)